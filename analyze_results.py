@@ -3,15 +3,17 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import os
 import glob  # 用于匹配文件名
+from columnar import load_dataframe
 
 
 def analyze_traffic_data():
-    # 1. 自动寻找 report 文件夹中最新的 traffic_analysis_*.csv 文件
-    search_path = os.path.join('report', 'traffic_analysis_*.csv')
-    files = glob.glob(search_path)
+    # 1. 自动寻找 report 文件夹中最新的车辆档案 (CSV，或按列导出的 .parquet / .cols 目录)
+    files = []
+    for pattern in ('traffic_analysis_*.csv', 'traffic_analysis_*.parquet', 'traffic_analysis_*.cols'):
+        files += glob.glob(os.path.join('report', pattern))
 
     if not files:
-        print("❌ 错误：在 report 文件夹中未找到任何 traffic_analysis CSV 文件。")
+        print("❌ 错误：在 report 文件夹中未找到任何 traffic_analysis 档案文件。")
         print("💡 提示：请确保你已经运行仿真并按过数字键 '8'。")
         return
 
@@ -21,7 +23,7 @@ def analyze_traffic_data():
 
     # 2. 确定报告保存的名称（也可以带上对应的时间戳）
     # 获取文件名（不带扩展名），用于命名图片
-    base_name = os.path.basename(latest_file).replace('.csv', '')
+    base_name = os.path.splitext(os.path.basename(latest_file))[0]
     output_image = os.path.join('report', f'report_{base_name}.png')
     flow_files = glob.glob(os.path.join('report', 'flow_data_*.csv'))
     if flow_files:
@@ -34,8 +36,12 @@ def analyze_traffic_data():
         plt.title('系统宏观效率随车数变化趋势')
         plt.savefig(os.path.join('report', 'macro_efficiency.png'))
     try:
-        df = pd.read_csv(latest_file)
-        df = df.fillna(0)  # 填充空值
+        if latest_file.endswith('.csv'):
+            df = pd.read_csv(latest_file)
+            df = df.fillna(0)  # 填充空值
+        else:
+            # 按列档案：内存映射读取，类型列已经是定长数组，无需逐行解析
+            df = load_dataframe(latest_file)
 
         # --- 绘图逻辑 (与之前一致) ---
         sns.set_theme(style="whitegrid")
@@ -63,6 +69,7 @@ def analyze_traffic_data():
 
         # 饼图：车型占比
         type_counts = df['type'].value_counts()
+        type_counts = type_counts[type_counts > 0]
         axes[1, 1].pie(type_counts, labels=type_counts.index, autopct='%1.1f%%', colors=['#ff9999', '#66b3ff'])
         axes[1, 1].set_title('实验样本比例', fontsize=14)
 
@@ -0,0 +1,86 @@
+class ApproachQueue:
+    """单个路口引道上的排队结构 (APPROACHING 车辆)。
+
+    双向链表按 (dist_to_center, 生成序号) 从小到大排列：队首最靠近停止线，
+    队尾是最后进入引道的车。队长、队尾位置、某辆车的前车都是 O(1) 查询。
+    """
+
+    def __init__(self):
+        self.head = None
+        self.tail = None
+        self._prev = {}
+        self._next = {}
+
+    def __len__(self):
+        return len(self._prev)
+
+    def __contains__(self, v):
+        return v in self._prev
+
+    def __iter__(self):
+        v = self.head
+        while v is not None:
+            yield v
+            v = self._next[v]
+
+    @staticmethod
+    def _key(v):
+        return v.dist_to_center, v.seq
+
+    def push(self, v):
+        """新车从引道末端加入队尾，并按位置校正顺序。"""
+        self._prev[v] = self.tail
+        self._next[v] = None
+        if self.tail is None:
+            self.head = v
+        else:
+            self._next[self.tail] = v
+        self.tail = v
+        self.reposition(v)
+
+    def remove(self, v):
+        p, n = self._prev.pop(v), self._next.pop(v)
+        if p is None:
+            self.head = n
+        else:
+            self._next[p] = n
+        if n is None:
+            self.tail = p
+        else:
+            self._prev[n] = p
+
+    def _swap_with_next(self, v):
+        n = self._next[v]
+        p, nn = self._prev[v], self._next[n]
+        # p <-> n <-> v <-> nn
+        if p is None:
+            self.head = n
+        else:
+            self._next[p] = n
+        if nn is None:
+            self.tail = v
+        else:
+            self._prev[nn] = v
+        self._prev[n], self._next[n] = p, v
+        self._prev[v], self._next[v] = n, nn
+
+    def reposition(self, v):
+        """v 的 dist_to_center 变化后调用；车辆很少超车，通常不需要移动。"""
+        key = self._key(v)
+        while self._prev[v] is not None and key < self._key(self._prev[v]):
+            self._swap_with_next(self._prev[v])
+        while self._next[v] is not None and self._key(self._next[v]) < key:
+            self._swap_with_next(v)
+
+    def leader(self, v):
+        """离中心更近 (dist 更小) 的最近一辆车，距离相同时取生成顺序靠前者。"""
+        dist = v.dist_to_center
+        p = self._prev[v]
+        while p is not None and p.dist_to_center == dist:
+            p = self._prev[p]
+        if p is None:
+            return None
+        lead_dist = p.dist_to_center
+        while self._prev[p] is not None and self._prev[p].dist_to_center == lead_dist:
+            p = self._prev[p]
+        return p
@@ -0,0 +1,136 @@
+import math
+import heapq
+
+HEADWAY_MODELS = ('poisson', 'empirical')
+RETRY_DELAY = 0.25  # 入口被队尾车辆占住时，到达推迟多少仿真秒再试
+
+
+class ArrivalScheduler:
+    """按需求曲线预先抽取各路口的到达时刻，放进按时间排序的事件日历 (heapq)。
+
+    rates[i] 为第 i 个路口的基准到达率 (辆/秒)，profile 为每 period 秒一段的需求倍数
+    (如 24 段的全天小时流量曲线，按 period 循环)，t 时刻的到达率 = rates[i] * profile[段]。
+    - 'poisson'：非齐次泊松过程，用最大到达率抽指数车头时距，再按 rate(t) / rate_max 接受 (thinning)；
+    - 'empirical'：从实测车头时距中有放回抽样，先归一化到均值 1，再按 rate(t) 做分段时间变换
+      (段内即除以该段到达率)，保留实测分布形状，且到达不会落在需求为 0 的时段。
+    每个路口日历中只挂一个 "下一次到达"，处理后再抽下一个，所以日历大小与仿真时长无关。
+    出口按起讫点矩阵 od[起点序号][终点序号] 的权重抽取，默认在其余路口中均匀选择。
+    """
+
+    def __init__(self, rng, arms, rates, profile=None, period=3600.0, model='poisson', headways=None, od=None):
+        if model not in HEADWAY_MODELS:
+            raise ValueError(f"未知的车头时距模型: {model} (可选 {', '.join(HEADWAY_MODELS)})")
+        if model == 'empirical' and not headways:
+            raise ValueError("empirical 模型需要提供实测车头时距 headways")
+        self.rng = rng
+        self.arms = list(arms)
+        n = len(self.arms)
+        self.set_rates(rates)
+        self.profile = [float(m) for m in profile] if profile else [1.0]
+        self.period = period
+        self.model = model
+        if headways:
+            mean = sum(headways) / len(headways)
+            self.headways = [h / mean for h in headways]
+        else:
+            self.headways = None
+        if od is None:
+            od = [[0.0 if i == j else 1.0 for j in range(n)] for i in range(n)]
+        # 每个起点的累积权重，抽终点时用一次 random() 二分查找
+        self.od_cum = []
+        for row in od:
+            if sum(row) <= 0:
+                raise ValueError("起讫点矩阵的每一行至少要有一个正权重")
+            total, cum = 0.0, []
+            for w in row:
+                total += w
+                cum.append(total)
+            self.od_cum.append(cum)
+
+        self.calendar = []  # (到达时刻, 序号, 起点序号, 终点序号 或 None, 是否为重试)
+        self._seq = 0
+        self.scheduled = [0] * n  # 各路口抽出的到达数
+        self.dropped = [0] * n  # 路口排满或总车数达到上限而丢弃的到达数
+        self.retries = 0
+        for i in range(n):
+            self._schedule_next(i, 0.0)
+
+    def set_rates(self, rates):
+        """基准到达率：一个数 (所有路口相同) 或每个路口一个值。已排进日历的到达不受影响。"""
+        n = len(self.arms)
+        self.rates = [float(rates)] * n if not isinstance(rates, (list, tuple)) else [float(r) for r in rates]
+
+    def rate(self, arm, t):
+        return self.rates[arm] * self.profile[int(t // self.period) % len(self.profile)]
+
+    @property
+    def next_time(self):
+        """日历中最早一次到达的时刻，没有待处理到达时为 inf。"""
+        return self.calendar[0][0] if self.calendar else math.inf
+
+    def _push(self, t, arm, dest, retry):
+        self._seq += 1
+        heapq.heappush(self.calendar, (t, self._seq, arm, dest, retry))
+
+    def _schedule_next(self, arm, now):
+        t = self._next_arrival(arm, now)
+        if t < math.inf:
+            self._push(t, arm, None, False)
+
+    def _next_arrival(self, arm, now):
+        rate_max = self.rates[arm] * max(self.profile)
+        if rate_max <= 0:
+            return math.inf
+        if self.model == 'empirical':
+            # 分段时间变换：归一化车头时距 h 是 "累计需求" 的增量，逐段按该段到达率消耗，
+            # 跨过时段边界时剩余部分换到下一段的到达率；需求为 0 的时段不消耗也不会有到达
+            h = self.rng.choice(self.headways)
+            t = now
+            while True:
+                end = (int(t // self.period) + 1) * self.period
+                rate = self.rate(arm, t)
+                if rate > 0:
+                    arrival = t + h / rate
+                    if arrival < end:
+                        return arrival
+                    h = max(0.0, h - (end - t) * rate)
+                t = end
+        t = now
+        while True:
+            t += self.rng.expovariate(rate_max)
+            if self.rng.random() * rate_max <= self.rate(arm, t):
+                return t
+
+    def destination(self, arm):
+        cum = self.od_cum[arm]
+        x = self.rng.random() * cum[-1]
+        lo, hi = 0, len(cum) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if cum[mid] > x:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def pop_due(self, now):
+        """取出一个已到期的到达 (起点序号, 终点序号)，没有时返回 None。
+
+        新到达在取出时抽终点并为该路口预约下一次到达；重试沿用原来的终点。
+        """
+        if not self.calendar or self.calendar[0][0] > now:
+            return None
+        t, _, arm, dest, retry = heapq.heappop(self.calendar)
+        if not retry:
+            self.scheduled[arm] += 1
+            dest = self.destination(arm)
+            self._schedule_next(arm, t)
+        return arm, dest
+
+    def retry(self, arm, dest, now):
+        """入口暂时被占，RETRY_DELAY 秒后再试。"""
+        self.retries += 1
+        self._push(now + RETRY_DELAY, arm, dest, True)
+
+    def drop(self, arm):
+        self.dropped[arm] += 1
@@ -0,0 +1,293 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+from datetime import datetime
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # draw 在离屏 Surface 上计时，不需要真实窗口
+
+import numpy as np
+import pygame
+from simulation import AdvancedSim
+from engine import SCREEN_SIZE, ROAD_LEN, R, LANE_OFFSET, STOP_LINE_DISTANCE
+from vehicle import APPROACHING, ENTERING, CIRCULATING, EXITING, STRAIGHT_OUT
+from vehicle_arrays import VehicleArrays
+from path_library import PATH_POINTS, EXIT_TRIGGER
+
+DEFAULT_SIZES = [25, 100, 1000, 10000]
+BENCHMARKS = ['update', 'get_lead_vehicle', 'check_ring_conflict', 'spawn_vehicle',
+              'generate_entry_path', 'generate_exit_path', 'draw']
+# 对比基线时必须一致的运行设置及其缺省值 (缺省值用于没有该字段的旧基线文件)
+COMPARE_META = {'batched_idm': False, 'ring_lanes': 1, 'ticks': 100, 'calls': 2000}
+# 合成车群中各状态的比例
+STATE_MIX = [(APPROACHING, 0.4), (ENTERING, 0.1), (CIRCULATING, 0.3), (EXITING, 0.1), (STRAIGHT_OUT, 0.1)]
+
+
+def make_sim(batched=False, lanes=1):
+    sim = AdvancedSim({'ring_lanes': lanes}, telemetry_dir=None)
+    sim.screen = pygame.Surface((SCREEN_SIZE, SCREEN_SIZE))  # 离屏绘制
+    if batched:
+        sim.state_arrays = VehicleArrays()
+    return sim
+
+
+def _new_vehicle(sim, rng, state):
+    sim.spawn_seq += 1
+    v = sim.pool.acquire(sim.spawn_seq, rng.choice(['aggressive', 'conservative']), sim.sim_time)
+    sim._apply_config(v)
+    v.state = state
+    v.start_angle = rng.choice(sim.directions)
+    v.end_angle = rng.choice([a for a in sim.directions if a != v.start_angle])
+    v.current_angle = v.start_angle
+    return v
+
+
+def populate(sim, n, seed=0):
+    """不经过 spawn_vehicle (它受总车数上限约束)，直接按 STATE_MIX 摆放 n 辆车并登记到各索引。"""
+    rng = random.Random(seed)
+    counts = [int(n * share) for _, share in STATE_MIX]
+    counts[0] += n - sum(counts)
+
+    approaching = []
+    for (state, _), count in zip(STATE_MIX, counts):
+        for _ in range(count):
+            v = _new_vehicle(sim, rng, state)
+            if state == APPROACHING:
+                v.dist_to_center = rng.uniform(STOP_LINE_DISTANCE, ROAD_LEN + R)
+                approaching.append(v)
+            elif state == ENTERING:
+                v.lane = rng.randrange(sim.ring_lanes)
+                v.ring_radius = sim.lane_radii[v.lane]
+                v.path_id = sim.generate_entry_path(v)
+                v.path_index = rng.uniform(0, PATH_POINTS - 2)
+                idx = int(v.path_index)
+                v.visual_x, v.visual_y = sim.paths.points[v.path_id, idx]
+                v.angle_to_draw = sim.paths.heading[v.path_id, idx]
+                v.current_angle = sim.paths.polar_angle[v.path_id, idx]
+                sim.ring_index.update(v)
+            elif state == CIRCULATING:
+                v.current_angle = rng.uniform(0, 2 * math.pi)
+                v.lane = rng.randrange(sim.ring_lanes)
+                v.ring_radius = sim.lane_radii[v.lane]
+                v.dist_to_center = v.ring_radius
+                sim.ring_index.update(v)
+            elif state == EXITING:
+                v.current_angle = (v.end_angle + EXIT_TRIGGER) % (2 * math.pi)
+                v.ring_radius = sim.lane_radii[0]
+                v.path_id = sim.generate_exit_path(v)
+                v.path_index = rng.uniform(0, PATH_POINTS - 2)
+                idx = int(v.path_index)
+                v.visual_x, v.visual_y = sim.paths.points[v.path_id, idx]
+                v.angle_to_draw = sim.paths.heading[v.path_id, idx]
+                v.dist_to_center = sim.paths.radius[v.path_id, idx]
+                sim.ring_index.update(v)
+            else:
+                v.dist_to_center = rng.uniform(R + LANE_OFFSET, 1000)
+                v.visual_x = v.visual_y = 0.0
+                v.angle_to_draw = v.end_angle
+            sim.vehicles.append(v)
+            if sim.state_arrays is not None:
+                sim.state_arrays.add(v)
+
+    # 按到中心距离从小到大入队，每次都落在队尾，避免逐个插入排序
+    for v in sorted(approaching, key=lambda v: v.dist_to_center):
+        sim.approach_queues[v.start_angle].push(v)
+    for v in sim.vehicles:
+        sim.get_coords(v)
+    return sim
+
+
+def summarize(samples_ns):
+    """单次调用耗时 (纳秒) -> 百分位 (毫秒) 与每秒调用次数。"""
+    ms = np.asarray(samples_ns, dtype=np.float64) / 1e6
+    p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+    return {
+        'calls': len(ms),
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(p50),
+        'p90_ms': float(p90),
+        'p99_ms': float(p99),
+        'max_ms': float(ms.max()),
+        'per_second': float(len(ms) / (ms.sum() / 1e3)) if ms.sum() > 0 else math.inf,
+    }
+
+
+def _time_each(fn, args):
+    clock = time.perf_counter_ns
+    samples = []
+    for arg in args:
+        start = clock()
+        fn(arg)
+        samples.append(clock() - start)
+    return samples
+
+
+def _sample(rng, items, calls):
+    return [rng.choice(items) for _ in range(calls)] if items else []
+
+
+def bench_size(name, n, ticks, calls, batched, seed, lanes=1):
+    """在 n 辆车的合成场景上运行一个基准，返回结果字典 (没有可测对象时返回 None)。"""
+    rng = random.Random(seed)
+    sim = populate(make_sim(batched, lanes), n, seed)
+    result = None
+
+    if name == 'update':
+        # ticks 个物理步；车群会随之演化 (入环、离场)，每步耗时即单帧延迟
+        result = summarize(_time_each(lambda _: sim.update(), range(ticks)))
+    elif name == 'get_lead_vehicle':
+        result = summarize(_time_each(sim.get_lead_vehicle, _sample(rng, sim.vehicles, calls)))
+    elif name == 'check_ring_conflict':
+        approaching = [v for v in sim.vehicles if v.state == APPROACHING]
+        if approaching:
+            result = summarize(_time_each(sim.check_ring_conflict, _sample(rng, approaching, calls)))
+    elif name == 'generate_entry_path':
+        scratch = [_new_vehicle(sim, rng, APPROACHING) for _ in range(calls)]
+        result = summarize(_time_each(sim.generate_entry_path, scratch))
+    elif name == 'generate_exit_path':
+        scratch = [_new_vehicle(sim, rng, CIRCULATING) for _ in range(calls)]
+        result = summarize(_time_each(sim.generate_exit_path, scratch))
+    elif name == 'draw':
+        result = summarize(_time_each(lambda _: sim.draw(), range(ticks)))
+    sim.close()
+    return result
+
+
+def bench_spawn(calls, seed):
+    """spawn_vehicle 受总车数上限约束，与场景规模无关：在空场景上生成后立即撤回，重复计时。"""
+    sim = make_sim()
+    sim.rng.seed(seed)
+    samples = []
+    clock = time.perf_counter_ns
+    for _ in range(calls):
+        start = clock()
+        sim.spawn_vehicle()
+        samples.append(clock() - start)
+        v = sim.vehicles.pop()
+        sim.approach_queues[v.start_angle].remove(v)
+    sim.close()
+    return summarize(samples)
+
+
+def peak_memory(n, ticks, batched, seed, lanes=1):
+    """构建 n 辆车的场景并运行 ticks 步期间 Python 堆的峰值 (字节)。"""
+    tracemalloc.start()
+    sim = populate(make_sim(batched, lanes), n, seed)
+    for _ in range(ticks):
+        sim.update()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    sim.close()
+    return peak
+
+
+def run_benchmarks(sizes=None, benchmarks=None, ticks=100, calls=2000, mem_ticks=10, batched=False, seed=0,
+                   lanes=1):
+    sizes = sizes or DEFAULT_SIZES
+    benchmarks = benchmarks or BENCHMARKS
+    results = []
+    for name in benchmarks:
+        if name == 'spawn_vehicle':
+            results.append(dict(bench=name, n=0, **bench_spawn(calls, seed)))
+            print(f"{name:>20}        -: p50 {results[-1]['p50_ms']:.4f} ms")
+            continue
+        for n in sizes:
+            summary = bench_size(name, n, ticks, calls, batched, seed, lanes)
+            if summary is None:
+                continue
+            row = dict(bench=name, n=n, **summary)
+            if name == 'update':
+                row['ticks_per_second'] = row['per_second']
+                row['peak_memory_bytes'] = peak_memory(n, mem_ticks, batched, seed, lanes)
+            results.append(row)
+            print(f"{name:>20} {n:>8}: p50 {row['p50_ms']:.4f} ms  p99 {row['p99_ms']:.4f} ms"
+                  f"  {row['per_second']:.0f}/s")
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'pygame': pygame.version.ver,
+            'ticks': ticks,
+            'calls': calls,
+            'batched_idm': batched,
+            'ring_lanes': lanes,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold=0.1, metric='p50_ms'):
+    """逐项对比 (基准名, 规模)，metric 比基线慢超过 threshold (相对值) 的记为回归。
+
+    两次运行的 COMPARE_META 设置 (批量路径、车道数、帧数/调用次数) 不同时耗时不可比，抛出 ValueError。
+    """
+    mismatched = [f"{key}: 基线 {baseline['meta'].get(key, default)!r}, 本次 {current['meta'].get(key, default)!r}"
+                  for key, default in COMPARE_META.items()
+                  if baseline['meta'].get(key, default) != current['meta'].get(key, default)]
+    if mismatched:
+        raise ValueError("与基线的运行设置不同，不能对比 (" + "; ".join(mismatched) + ")")
+    base = {(r['bench'], r['n']): r for r in baseline['results']}
+    rows = []
+    for r in current['results']:
+        old = base.get((r['bench'], r['n']))
+        if old is None or not old[metric]:
+            continue
+        change = r[metric] / old[metric] - 1
+        rows.append({'bench': r['bench'], 'n': r['n'], 'baseline': old[metric], 'current': r[metric],
+                     'change': change, 'regression': change > threshold})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="仿真热点路径的规模基准测试 (输出 JSON)")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="合成车群规模")
+    parser.add_argument('--bench', nargs='+', choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument('--ticks', type=int, default=100, help="update/draw 每个规模的计时帧数")
+    parser.add_argument('--calls', type=int, default=2000, help="单车函数每个规模的调用次数")
+    parser.add_argument('--batched', action='store_true', help="使用批量 IDM 路径")
+    parser.add_argument('--lanes', type=int, default=1, help="环道车道数")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help="结果文件，默认 report/benchmark_<时间戳>.json")
+    parser.add_argument('--compare', default=None, help="基线 JSON：对比并标出回归，有回归时退出码为 1")
+    parser.add_argument('--threshold', type=float, default=0.1, help="判为回归的相对变慢幅度 (默认 10%%)")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.sizes, args.bench, args.ticks, args.calls, batched=args.batched, seed=args.seed,
+                            lanes=args.lanes)
+
+    filename = args.output
+    if filename is None:
+        if not os.path.exists('report'):
+            os.makedirs('report')
+        filename = os.path.join('report', f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"基准结果已保存至: {filename}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        try:
+            rows = compare(report, baseline, args.threshold)
+        except ValueError as exc:
+            print(exc)
+            sys.exit(2)
+        for r in rows:
+            flag = "  <-- 回归" if r['regression'] else ""
+            print(f"{r['bench']:>20} {r['n']:>8}: {r['baseline']:.4f} -> {r['current']:.4f} ms"
+                  f" ({r['change']:+.1%}){flag}")
+        if any(r['regression'] for r in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import os
+import json
+import numpy as np
+
+try:  # Parquet 为可选依赖，没有 pyarrow 时退回 .npy 列文件 + JSON 清单
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# 车辆档案各列的存储类型；category 列按编码存储，取值表写在清单里
+COLUMNS = {
+    'id': np.int64,
+    'type': 'category',
+    'travel_time': np.float64,
+    'wait_time': np.float64,
+    'conflicts': np.int32,
+    'status': 'category',
+}
+CATEGORIES = {
+    'type': ['aggressive', 'conservative'],
+    'status': ['completed', 'still_in_simulation'],
+}
+MANIFEST = 'manifest.json'
+
+
+def _to_columns(records):
+    """把档案行批量转换成按列存放的 NumPy 数组 (category 列为 uint8 编码)。"""
+    values = {name: [] for name in COLUMNS}
+    for row in records:
+        for name in COLUMNS:
+            values[name].append(row[name])
+
+    columns = {}
+    for name, dtype in COLUMNS.items():
+        if dtype == 'category':
+            lookup = {label: code for code, label in enumerate(CATEGORIES[name])}
+            columns[name] = np.fromiter((lookup[x] for x in values[name]), np.uint8, len(values[name]))
+        else:
+            columns[name] = np.asarray(values[name], dtype=dtype)
+    return columns
+
+
+def write_columnar(records, path, use_parquet=None):
+    """写出列式档案，返回实际写出的路径。
+
+    有 pyarrow 时写 path + '.parquet'；否则写目录 path + '.cols'，
+    每列一个 .npy 文件，外加记录行数、类型与分类取值表的 manifest.json。
+    """
+    columns = _to_columns(records)
+    if use_parquet is None:
+        use_parquet = pq is not None
+
+    if use_parquet:
+        arrays = []
+        for name, dtype in COLUMNS.items():
+            if dtype == 'category':
+                arrays.append(pa.DictionaryArray.from_arrays(columns[name], pa.array(CATEGORIES[name])))
+            else:
+                arrays.append(pa.array(columns[name]))
+        out = path + '.parquet'
+        pq.write_table(pa.Table.from_arrays(arrays, names=list(COLUMNS)), out)
+        return out
+
+    out = path + '.cols'
+    if not os.path.exists(out):
+        os.makedirs(out)
+    manifest = {'format': 'npy', 'rows': len(columns['id']), 'columns': {}}
+    for name, dtype in COLUMNS.items():
+        np.save(os.path.join(out, f'{name}.npy'), columns[name])
+        entry = {'file': f'{name}.npy', 'dtype': str(columns[name].dtype)}
+        if dtype == 'category':
+            entry['categories'] = CATEGORIES[name]
+        manifest['columns'][name] = entry
+    with open(os.path.join(out, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return out
+
+
+def load_columns(path):
+    """以内存映射方式打开 .cols 目录，返回 ({列名: 数组}, {列名: 分类取值表})。"""
+    with open(os.path.join(path, MANIFEST), encoding='utf-8') as f:
+        manifest = json.load(f)
+    columns, categories = {}, {}
+    for name, entry in manifest['columns'].items():
+        columns[name] = np.load(os.path.join(path, entry['file']), mmap_mode='r')
+        if 'categories' in entry:
+            categories[name] = entry['categories']
+    return columns, categories
+
+
+def load_dataframe(path):
+    """把列式档案 (.parquet 文件或 .cols 目录) 读成 pandas DataFrame，分类列为 category 类型。"""
+    import pandas as pd
+
+    if path.endswith('.parquet'):
+        return pq.read_table(path, memory_map=True).to_pandas()
+
+    columns, categories = load_columns(path)
+    data = {}
+    for name, values in columns.items():
+        if name in categories:
+            data[name] = pd.Categorical.from_codes(values, categories=categories[name])
+        else:
+            data[name] = values
+    return pd.DataFrame(data, copy=False)
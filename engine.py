@@ -0,0 +1,707 @@
+import os
+import csv
+from datetime import datetime
+import math
+import random
+from collections import deque
+import numpy as np
+from vehicle import VehiclePool, APPROACHING, ENTERING, CIRCULATING, EXITING, STRAIGHT_OUT
+from vehicle_arrays import VehicleArrays
+from ring_index import LaneRingIndex
+from approach_queue import ApproachQueue
+from telemetry import Telemetry
+from trips import TripSink, TRIP_KEYS
+from columnar import write_columnar
+from trajectory import TrajectoryRecorder
+from profiler import PhaseProfiler
+from events import EventBus, SPAWN, ENTER_RING, EXIT_RING, DESPAWN, CONFLICT
+from online_stats import StreamingStats
+from heatmap import ConflictHeatmap
+from arrivals import ArrivalScheduler
+from path_library import PathLibrary, PATH_POINTS, EXIT_TRIGGER, ENTRY_SHIFT
+
+# --- 场景常量 (与 pygame 窗口尺寸保持一致，但本模块不依赖 pygame) ---
+SCREEN_SIZE = 800
+WIDTH = 800
+HEIGHT = 800
+CENTER = WIDTH // 2
+R = 120  # 环岛半径
+ROAD_LEN = 250  # 引道长度
+LANE_OFFSET = 25  # 车道中心相对道路中线/环岛边线的偏移
+LANE_WIDTH = 25  # 多车道环岛中相邻环道的半径差
+STOP_LINE_DISTANCE = 175  # 停止线到环岛中心的距离
+
+PHYSICS_DT = 0.02  # 每个物理步对应的仿真秒数
+APPROACH_QUEUE_LIMIT = 8  # 单个路口引道上最多排队的车辆数，排满时新到达被丢弃
+LEAD_WINDOW = 0.8  # 环岛内只关注前方 0.8 弧度（约 45 度）内的车
+# 入场礼让窗口 (乘以 config['yield_angle'])：入口下游 0.5 弧度、上游 0.2 弧度内有车就等待
+YIELD_AHEAD = 0.5
+YIELD_BEHIND = 0.2
+
+# 容量由几何决定：每条环道按周长 / RING_SPACING 容纳车辆 (单车道 145 半径 -> 15 辆)，
+# 总车数上限再加上各路口排队车辆的名额 APPROACH_SLOTS (单车道时共 25 辆)
+RING_SPACING = 60
+APPROACH_SLOTS = 10
+# 内侧车道的车在距出口 LANE_CHANGE_ANGLE 弧度内尝试向外换道，目标车道前后需空出的弧度；
+# 只能从最外侧车道驶出，换道不成功就多绕一圈
+LANE_CHANGE_ANGLE = 1.0
+LANE_CHANGE_AHEAD = 0.2
+LANE_CHANGE_BEHIND = 0.15
+LANE_CHANGE_RATE = 25.0  # 换道时绘制位置的横向移动速度 (像素/秒)，不影响物理
+RING_MAX_SPEED = 12.0  # 环道内的限速 (像素/秒)
+
+HEATMAP_CELL = 10  # 冲突热力图网格的边长 (像素)
+HEATMAP_HALF_LIFE = 60.0  # "近期冲突" 热力图的半衰期 (仿真秒)
+TRAVEL_TIME_KEEP = 10000  # 通行时间分布图只用最近这么多辆车，完整档案在 TripSink 中
+
+# 默认实验参数；车辆参数按 "当前值 / 默认值" 的比例缩放，默认配置下与车型原始参数一致
+DEFAULT_CONFIG = {
+    "car_max_v": 25.0,  # 红车最大速度
+    "truck_max_v": 15.0,  # 蓝车最大速度
+    "safe_gap": 40.0,  # 基础安全跟车距离 (像素)
+    "yield_angle": 1,  # 入场礼让判定弧度 (越大越保守)
+    "spawn_rate": 0.5,  # 每个路口的基准到达率 (辆/秒)，也可以给每个路口一个值的列表
+    "ring_lanes": 1,  # 环道车道数 (构造时确定)
+    # 以下需求参数在构造时确定 (见 arrivals.ArrivalScheduler)
+    "demand_profile": None,  # 每 demand_period 秒一段的需求倍数，如 24 段小时流量曲线；None 为恒定需求
+    "demand_period": 3600.0,
+    "headway_model": "poisson",  # 'poisson' 或 'empirical'
+    "empirical_headways": None,  # empirical 模型的实测车头时距 (秒)
+    "od_matrix": None,  # od_matrix[起点][终点] 的出口选择权重，路口顺序同 directions；None 为其余路口均分
+}
+
+# 车辆档案 (traffic_analysis_*.csv) 的列
+RECORD_KEYS = TRIP_KEYS
+
+# 中心岛的最小半径 (像素)：最内侧车道中心须在岛边缘之外至少半个车道宽
+MIN_ISLAND_RADIUS = 30
+MAX_RING_LANES = int((R + LANE_OFFSET - MIN_ISLAND_RADIUS - LANE_WIDTH / 2) // LANE_WIDTH) + 1
+
+
+def check_ring_lanes(ring_lanes):
+    """校验环道车道数并返回整数；须为 1 ~ MAX_RING_LANES (最内侧车道不能压到中心岛)。"""
+    lanes = int(ring_lanes)
+    if isinstance(ring_lanes, float) and lanes != ring_lanes:
+        raise ValueError(f"ring_lanes 须为整数 (得到 {ring_lanes!r})")
+    if lanes < 1:
+        raise ValueError(f"ring_lanes 至少为 1 (得到 {ring_lanes!r})")
+    if lanes > MAX_RING_LANES:
+        raise ValueError(f"ring_lanes 最多为 {MAX_RING_LANES} (得到 {ring_lanes!r})：更多车道时最内侧车道"
+                         f"半径不足中心岛半径 {MIN_ISLAND_RADIUS} 加半个车道宽")
+    return lanes
+
+
+class RoundaboutEngine:
+    """环岛仿真核心：只负责车辆状态与统计，按仿真时钟推进，不打开任何窗口。"""
+
+    def __init__(self, config=None, batched_idm=False, seed=None, telemetry_dir=None):
+        self.vehicles = []
+        # 离场车辆对象回收后给新车复用
+        self.pool = VehiclePool()
+        # 入口/出口角度定义: 0:右, pi/2:下, pi:左, 3pi/2:上
+        self.directions = [0, np.pi / 2, np.pi, 3 * np.pi / 2]
+
+        # 车辆生命周期事件；已离开车辆的档案由 TripSink 收集 (超出内存预算时溢写磁盘)
+        self.events = EventBus()
+        self.trips = TripSink()
+        self.events.subscribe(DESPAWN, self._record_trip)
+        # 在线统计：按车型/路口的计数、均值方差与分位数，由生命周期事件 O(1) 更新
+        self.stats = StreamingStats(self.directions)
+        self.stats.attach(self.events)
+        # 冲突热力图：固定分辨率网格在线累计 (另有按半衰期衰减的近期视图)，内存与运行时长无关
+        self.heatmap = ConflictHeatmap(SCREEN_SIZE, HEATMAP_CELL, HEATMAP_HALF_LIFE)
+        self.heatmap.attach(self.events)
+
+        self.total_conflicts = 0  # 全局冲突计数器
+        self.safety_threshold = 2.0  # 定义危险距离（米）：小于2米视为冲突
+
+        self.weight_aggressive = 5  # 激进车初始权重
+        self.weight_conservative = 5  # 保守车初始权重
+
+        self.config = dict(DEFAULT_CONFIG)
+        if config:
+            self.config.update(config)
+
+        # 每个仿真实例独立的随机数流：相同 (config, seed) 得到逐位相同的轨迹
+        self.seed = seed
+        self.rng = random.Random(seed)
+        # 到达使用由种子派生的独立随机数流：车辆行为参数不同的实验看到同一串到达 (公共随机数)
+        self.arrival_rng = random.Random(self.rng.getrandbits(64))
+
+        # 仿真时钟：所有时间统计都以仿真秒为单位，与渲染帧率无关
+        self.dt = PHYSICS_DT
+        self.tick = 0
+        self.sim_time = 0.0
+        self.skipped_ticks = 0  # 空场时跳过的物理步数
+
+        # 入口/出口路径表，所有车辆共享
+        self.paths = PathLibrary(CENTER, R, LANE_OFFSET, LANE_WIDTH)
+
+        # 环道几何与由此得出的容量
+        self.ring_lanes = check_ring_lanes(self.config['ring_lanes'])
+        self.lane_radii = [self.paths.lane_radius(k) for k in range(self.ring_lanes)]
+        self.ring_capacity = sum(int(2 * math.pi * r // RING_SPACING) for r in self.lane_radii)
+        self.vehicle_capacity = self.ring_capacity + APPROACH_SLOTS
+
+        # 到达日历：按需求曲线预先抽取各路口的到达时刻，到期时才处理
+        self.arrivals = ArrivalScheduler(self.arrival_rng, self.directions, self.config['spawn_rate'],
+                                         self.config['demand_profile'], self.config['demand_period'],
+                                         self.config['headway_model'], self.config['empirical_headways'],
+                                         self.config['od_matrix'])
+
+        # 每个路口一条按 dist_to_center 排序的排队队列
+        self.approach_queues = {angle: ApproachQueue() for angle in self.directions}
+
+        # 每条环道一个按角度排序的索引，前车查找只看本车道的相邻车辆
+        self.ring_index = LaneRingIndex(self.ring_lanes)
+        self.spawn_seq = 0  # 生成序号，同时作为车辆 ID (从 1 开始递增，不会重复)
+
+        # 批量 IDM：车辆状态另存一份 SoA 数组，每步一次性算出全部加速度
+        self.state_arrays = VehicleArrays() if batched_idm else None
+
+        # 流量/冲突时间序列：内存中只保留最近的数据，给定 telemetry_dir 时完整序列后台写盘
+        self.telemetry = Telemetry(telemetry_dir, datetime.now().strftime("%Y%m%d_%H%M%S"))
+
+        # 轨迹录制 (start_recording 开启)：每个物理步的车辆位姿写入二进制日志，供 replay.py 回放
+        self.recorder = None
+
+        # 分阶段耗时统计 (默认关闭，关闭时没有任何开销)；状态机耗时 = update 总耗时 - 前车查找 - 冲突检测
+        self.profiler = PhaseProfiler(self, {
+            'process_arrivals': 'spawn',
+            'update': 'update',
+            'get_lead_vehicle': 'update.leader',
+            'check_ring_conflict': 'update.conflict',
+        }, derived={'update.state_machine': ('update', ['update.leader', 'update.conflict'])})
+
+        # 数据统计容器
+        self.stats_travel_times = deque(maxlen=TRAVEL_TIME_KEEP)  # 最近完成通行车辆的总时间
+        self.stats_conflicts = self.telemetry.conflicts  # 最近的冲突点坐标 (x, y)
+        self.stats_flow_data = self.telemetry.flow  # 每秒的 (平均环岛车数, 平均速度)
+        self.stat_timer = 0
+        self.speed_sum = 0.0  # 上一步结束时全场车速之和 / 车数 (get_avg_speed 用)
+        self.speed_count = 0
+
+    def step(self, max_ticks=1):
+        """推进一个物理步：处理已到期的到达，然后更新所有车辆。返回实际推进的物理步数。
+
+        max_ticks > 1 时允许跳过空闲期：场上没有车辆时，到下一次到达之前的每一步
+        update() 都不会改变任何状态，直接把时钟拨到到达所在的那一步 (最多 max_ticks 步)，
+        结果与逐步推进逐位相同。录制轨迹时不跳过，保证每个物理步都有一帧。
+        """
+        if max_ticks > 1 and not self.vehicles and self.recorder is None:
+            idle = self.idle_ticks()
+            if idle > 0:
+                skip = min(idle, max_ticks)
+                self.tick += skip
+                self.sim_time = self.tick * self.dt
+                self.skipped_ticks += skip
+                return skip
+
+        if self.arrivals.next_time <= self.sim_time:
+            self.process_arrivals()
+
+        self.update()
+        self.advance_clock()
+        return 1
+
+    def advance_clock(self):
+        """一个物理步的更新完成后推进仿真时钟，并录制这一帧。"""
+        self.tick += 1
+        self.sim_time = self.tick * self.dt
+        if self.recorder is not None:
+            self.recorder.record(self)
+
+    def idle_ticks(self):
+        """空场时距下一次到达还有多少个物理步 (到达在 tick * dt >= 到达时刻的第一步处理)。"""
+        next_time = self.arrivals.next_time
+        if next_time == math.inf:
+            return math.inf
+        k = math.ceil(next_time / self.dt)
+        # 与 step() 中的判定 (tick * dt 与到达时刻比较) 保持一致，消除除法的舍入误差
+        while k > 0 and (k - 1) * self.dt >= next_time:
+            k -= 1
+        while k * self.dt < next_time:
+            k += 1
+        return max(0, k - self.tick)
+
+    def run_steps(self, n):
+        """无界面连续推进 n 个物理步，速度只受 CPU 限制；空场期间直接跳到下一次到达。"""
+        done = 0
+        while done < n:
+            done += self.step(n - done)
+            if self.profiler.enabled:
+                self.profiler.end_frame()
+
+    def process_arrivals(self):
+        """生成所有已到期的到达：入口被占的推迟 RETRY_DELAY 秒重试，路口排满或总数已满的丢弃并计数。"""
+        while True:
+            due = self.arrivals.pop_due(self.sim_time)
+            if due is None:
+                return
+            arm, dest = due
+            status = self.spawn_vehicle(self.directions[arm], self.directions[dest])
+            if status == 'blocked':
+                self.arrivals.retry(arm, dest, self.sim_time)
+            elif status == 'full':
+                self.arrivals.drop(arm)
+
+    def spawn_vehicle(self, start_angle=None, end_angle=None):
+        """在 start_angle 路口生成一辆驶向 end_angle 的车 (未给出时随机选择)。
+
+        返回 'spawned'；'blocked' 表示入口被队尾车辆占住；'full' 表示路口排满、
+        总车数已达上限或车型权重全为 0。
+        """
+        # 1. 总数限制：环岛容量 + 各路口排队名额 (单车道时为 25 = 环岛15 + 4路口*2-3辆)
+        if len(self.vehicles) >= self.vehicle_capacity:
+            return 'full'
+
+        # 计算当前的概率分布
+        total_w = self.weight_aggressive + self.weight_conservative
+        if total_w == 0: return 'full'  # 防止除以0
+
+        # 2. 每个路口的排队人数直接取队列长度，排队不能超过 APPROACH_QUEUE_LIMIT 辆
+        if start_angle is None:
+            available_lanes = [ang for ang in self.directions
+                               if len(self.approach_queues[ang]) < APPROACH_QUEUE_LIMIT]
+            if not available_lanes:
+                return 'full'
+            start_angle = self.rng.choice(available_lanes)
+        elif len(self.approach_queues[start_angle]) >= APPROACH_QUEUE_LIMIT:
+            return 'full'
+        selected_angle = start_angle
+
+        # 3. 安全间距检查：该路口队尾那辆车是否已经让出了入口
+        tail = self.approach_queues[selected_angle].tail
+        too_close = tail is not None and tail.dist_to_center > (ROAD_LEN + R - 50)
+
+        if too_close:
+            return 'blocked'
+
+        # 4. 抽签决定车型
+        prob_agg = self.weight_aggressive / total_w
+        v_type = "aggressive" if self.rng.random() < prob_agg else "conservative"
+
+        self.spawn_seq += 1
+        v = self.pool.acquire(self.spawn_seq, v_type, self.sim_time)
+        self._apply_config(v)
+        v.start_angle = selected_angle
+        if end_angle is None:
+            end_angle = self.rng.choice([a for a in self.directions if a != selected_angle])
+        v.end_angle = end_angle
+        v.dist_to_center = ROAD_LEN + R
+        v.current_angle = v.start_angle
+        self.vehicles.append(v)
+        self.approach_queues[selected_angle].push(v)
+        if self.state_arrays is not None:
+            self.state_arrays.add(v)
+        self.events.emit(SPAWN, v, self.sim_time)
+        return 'spawned'
+
+    def _apply_config(self, v):
+        """把实验参数作用到新车上：最大速度缩放期望速度 v0，安全间距缩放最小间距 s0。"""
+        speed_key = "car_max_v" if v.type == "aggressive" else "truck_max_v"
+        v.v0 *= self.config[speed_key] / DEFAULT_CONFIG[speed_key]
+        v.s0 *= self.config['safe_gap'] / DEFAULT_CONFIG['safe_gap']
+
+    def get_coords(self, v):
+        # --- 1. 弧线进入状态：直接返回 update 算好的位置 ---
+        if v.state == ENTERING:
+            return v.visual_x, v.visual_y
+
+        # --- 2. 环岛状态：没有任何 base + offset，直接用圆周方程 ---
+        if v.state == CIRCULATING:
+            # 换道过程中绘制半径从原车道逐渐移到新车道
+            r = v.ring_radius + v.radius_offset
+            v.visual_x = CENTER + r * np.cos(v.current_angle)
+            v.visual_y = CENTER + r * np.sin(v.current_angle)
+            v.angle_to_draw = v.current_angle + np.pi / 2 + np.pi
+            return v.visual_x, v.visual_y
+
+        # --- 3. 引道状态：手动处理偏移，确保不产生跳变 ---
+        if v.state == APPROACHING:
+            # 基础直线位置
+            base_x = CENTER + v.dist_to_center * np.cos(v.start_angle)
+            base_y = CENTER + v.dist_to_center * np.sin(v.start_angle)
+
+            # 偏移向量（向右 25 像素）
+            target_ox = LANE_OFFSET * np.cos(v.start_angle - np.pi / 2)
+            target_oy = LANE_OFFSET * np.sin(v.start_angle - np.pi / 2)
+
+            v.visual_x = base_x + target_ox
+            v.visual_y = base_y + target_oy
+            v.angle_to_draw = v.start_angle + np.pi
+            return v.visual_x, v.visual_y
+
+        return v.visual_x, v.visual_y
+
+    def get_avg_speed(self):
+        """当前场上所有车辆的平均速度 (取 update 末尾顺带算好的速度和，O(1))"""
+        if not self.speed_count:
+            return 0.0
+        return self.speed_sum / self.speed_count
+
+    def update(self, batch=None):
+        """更新所有车辆一个物理步；batch 为批量路径预先算好的 (前车, 加速度, 环道运动学...)，
+        按 self.vehicles 的顺序排列 (见 batch_rows)，未给出时按需自行计算。"""
+        DT = self.dt
+        CENTER_X, CENTER_Y = CENTER, CENTER
+
+        # 计算环岛内的活跃车辆数
+        in_ring_count = sum(1 for veh in self.vehicles if ENTERING <= veh.state <= EXITING)
+
+        if batch is None and self.state_arrays is not None:
+            batch = self._batched_accelerations()
+
+        # 离场车辆先记下，循环结束后一次性按原顺序压缩列表 (逐个 list.remove 为 O(N))；
+        # 更新顺序决定了同一步内后车看到的是前车的新状态还是旧状态，所以不能用交换删除打乱顺序
+        vehicles = self.vehicles
+        despawned = []
+        for i in range(len(vehicles)):
+            v = vehicles[i]
+            # 1. 基础物理更新
+            if batch is None:
+                lead_v = self.get_lead_vehicle(v)
+                v.a = v.update_acceleration(lead_v)
+            else:
+                lead_v, v.a = batch[0][i], float(batch[1][i])
+
+            # 强行起步补丁
+            if v.v < 0.2:
+                if not lead_v or (v.state == APPROACHING and v.dist_to_center - lead_v.dist_to_center > 55):
+                    if v.state != APPROACHING or not self.check_ring_conflict(v):
+                        v.a = max(v.a, 0.8)
+                # 停车等待时间按仿真秒累计
+                v.wait_time += DT
+
+            v.v += v.a * DT
+            v.v = max(0, v.v)
+
+            # 2. 状态机
+            if v.state == APPROACHING:
+                # 入场门槛：环岛未满 且 至少最外侧车道门口没车 (check_ring_conflict 同时选定车道)
+                can_enter_ring = (in_ring_count < self.ring_capacity) and (not self.check_ring_conflict(v))
+
+                # 判定前车：如果前车在停止线没走，我也不能动
+                if lead_v and (v.dist_to_center - lead_v.dist_to_center < 50):
+                    can_enter_ring = False
+
+                if v.dist_to_center <= STOP_LINE_DISTANCE:
+                    if can_enter_ring:
+                        v.state = ENTERING
+                        v.ring_radius = self.lane_radii[v.lane]
+                        v.path_id = self.generate_entry_path(v)
+                        v.path_index = 0
+                        v.v = max(v.v, 2.5)  # 瞬时速度，防止卡死
+                        in_ring_count += 1  # 实时更新计数
+                        self.approach_queues[v.start_angle].remove(v)
+                        self.ring_index.update(v)
+                        v.enter_time = self.sim_time
+                        self.events.emit(ENTER_RING, v, self.sim_time)
+                        continue
+                    else:
+                        v.v = 0
+                        v.dist_to_center = STOP_LINE_DISTANCE
+                else:
+                    v.dist_to_center -= v.v * DT
+                self.approach_queues[v.start_angle].reposition(v)
+
+                # 同步位置
+                self.get_coords(v)
+
+            elif v.state == ENTERING:
+                v.v = min(max(v.v, 2.0), 6.0)  # 转弯保底 2.0
+                v.path_index += 0.8
+                idx = int(v.path_index)
+                if idx < PATH_POINTS - 1:
+                    # 沿共享路径查表：坐标、朝向、相对中心的角度
+                    v.visual_x, v.visual_y = self.paths.points[v.path_id, idx]
+                    v.angle_to_draw = self.paths.heading[v.path_id, idx]
+                    v.current_angle = self.paths.polar_angle[v.path_id, idx]
+                    self.ring_index.update(v)
+                else:
+                    v.state = CIRCULATING
+
+            elif v.state == CIRCULATING:
+                if batch is not None and batch[2][i]:
+                    # 批量路径已按本步开始时的状态算好限速后的速度与新角度
+                    v.v, v.current_angle = float(batch[3][i]), float(batch[4][i])
+                else:
+                    v.v = max(v.v, 3.0)
+                    v.v = min(v.v, RING_MAX_SPEED)
+                    v.current_angle -= (v.v / v.ring_radius) * DT
+                    v.current_angle %= (2 * np.pi)
+                if v.radius_offset:
+                    step = LANE_CHANGE_RATE * DT
+                    v.radius_offset = max(v.radius_offset - step, min(v.radius_offset + step, 0.0))
+                self.ring_index.update(v)
+                self.get_coords(v)
+                v.angle_to_draw = v.current_angle - math.pi / 2
+
+                # 检查是否到出口：内侧车道先换到外侧车道，只有外侧车道可以驶出
+                angle_to_exit = (v.current_angle - v.end_angle) % (2 * np.pi)
+                if v.lane > 0:
+                    if self.lane_change_cutoff(v) < angle_to_exit < LANE_CHANGE_ANGLE:
+                        self.try_lane_change(v)
+                elif angle_to_exit < EXIT_TRIGGER:
+                    v.state = EXITING
+                    v.path_id = self.generate_exit_path(v)
+                    v.path_index = 0
+
+            elif v.state == EXITING:
+                v.v = max(v.v, 2.5)  # 强行排空，出口车就是大爷
+                v.path_index += 0.8
+                idx = int(v.path_index)
+                if idx < PATH_POINTS - 1:
+                    v.visual_x, v.visual_y = self.paths.points[v.path_id, idx]
+                    v.angle_to_draw = self.paths.heading[v.path_id, idx]
+                    v.dist_to_center = self.paths.radius[v.path_id, idx]
+                else:
+                    v.state = STRAIGHT_OUT
+                    self.ring_index.remove(v)
+                    v.finish_time = self.sim_time
+                    self.events.emit(EXIT_RING, v, self.sim_time)
+
+            elif v.state == STRAIGHT_OUT:
+                v.dist_to_center += v.v * DT
+                exit_angle = v.end_angle
+                # 重新计算坐标防止漂移
+                v.visual_x = CENTER_X + v.dist_to_center * math.cos(exit_angle) - LANE_OFFSET * math.sin(exit_angle)
+                v.visual_y = CENTER_Y + v.dist_to_center * math.sin(exit_angle) + LANE_OFFSET * math.cos(exit_angle)
+                v.angle_to_draw = exit_angle
+
+                # 离开画面：移出仿真，档案只在这里记录一次
+                if v.dist_to_center > 1000:
+                    despawned.append(v)
+                    if self.state_arrays is not None:
+                        self.state_arrays.remove(v)
+                    self.events.emit(DESPAWN, v, self.sim_time)
+
+        if despawned:
+            gone = set(map(id, despawned))
+            self.vehicles = [v for v in vehicles if id(v) not in gone]
+            for v in despawned:
+                self.pool.release(v)
+
+        # 统计效率：一次遍历同时得到全场速度和与环岛内车数/速度和
+        speed_sum = ring_speed = 0.0
+        flow_count = 0
+        for v in self.vehicles:
+            speed_sum += v.v
+            if v.state == CIRCULATING:
+                flow_count += 1
+                ring_speed += v.v
+        self.speed_sum, self.speed_count = speed_sum, len(self.vehicles)
+        if flow_count > 0:
+            self.telemetry.add_flow(self.sim_time, flow_count, ring_speed / flow_count)
+
+    def _batched_accelerations(self):
+        """以本步开始时的状态为准，先找齐前车，再一次性批量计算 IDM 加速度与环道运动学。"""
+        arrays = self.state_arrays
+        leads = [self.get_lead_vehicle(v) for v in self.vehicles]
+        arrays.sync()
+        lead_slots = np.full(arrays.size, -1, dtype=np.intp)
+        self.fill_lead_slots(leads, lead_slots)
+        accels = arrays.accelerations(lead_slots)
+        return self.batch_rows(leads, accels, *arrays.ring_kinematics(accels, self.dt))
+
+    def fill_lead_slots(self, leads, lead_slots):
+        """把前车列表 (按 self.vehicles 顺序) 写成按槽位索引的前车槽位数组。"""
+        for v, lead_v in zip(self.vehicles, leads):
+            if lead_v is not None:
+                lead_slots[v.slot] = lead_v.slot
+
+    def batch_rows(self, leads, *slot_arrays):
+        """把按槽位排列的批量结果重排成 self.vehicles 的顺序，得到 update(batch) 的参数。
+
+        返回 (前车, 加速度, 环道 mask, 环道速度, 环道角度)。
+        """
+        order = np.fromiter((v.slot for v in self.vehicles), np.intp, len(self.vehicles))
+        return (leads,) + tuple(arr[order] for arr in slot_arrays)
+
+    def preferred_lane(self, v):
+        """按出口远近选择目标环道：第一个出口走最外侧车道，越远的出口越靠内。"""
+        exits = round(((v.start_angle - v.end_angle) % (2 * math.pi)) / (math.pi / 2))
+        return max(0, min(self.ring_lanes - 1, exits - 1))
+
+    def lane_change_cutoff(self, v):
+        """距出口小于此弧度时不再向外换道 (错过出口就多绕一圈)。
+
+        换道后绘制半径还要按 LANE_CHANGE_RATE 收敛到新车道；出口路径从外侧车道上
+        出口上游 EXIT_TRIGGER 处开始，所以换道必须留出以最高车速收敛所需的弧度，
+        否则驶出时车辆会在路径起点处横向/纵向跳变。
+        """
+        target = v.lane - 1
+        shift = abs(v.radius_offset) + abs(self.lane_radii[target] - self.lane_radii[v.lane])
+        return EXIT_TRIGGER + (shift / LANE_CHANGE_RATE) * RING_MAX_SPEED / self.lane_radii[target]
+
+    def try_lane_change(self, v):
+        """向外换一条车道；目标车道在当前位置前后的窗口内有车则放弃，返回是否换道成功。"""
+        target = v.lane - 1
+        if self.ring_index.first_in_window(v.current_angle, LANE_CHANGE_AHEAD, LANE_CHANGE_BEHIND, target) is not None:
+            return False
+        old_radius = v.ring_radius
+        v.lane = target
+        v.ring_radius = self.lane_radii[target]
+        v.radius_offset += old_radius - v.ring_radius
+        self.ring_index.update(v)
+        return True
+
+    def generate_entry_path(self, v):
+        """取该路口通往 v.lane 车道的共享入口路径编号，并把车辆对准路径起点。"""
+        path_id = self.paths.entry_path(v.start_angle, v.lane)
+
+        # 强制同步：把车子的物理角度也对准汇入角度
+        # 这样当它结束弧线进入环岛时，位置和角度是完美的
+        v.current_angle = v.start_angle - ENTRY_SHIFT
+        v.visual_x, v.visual_y = self.paths.points[path_id, 0]
+        return path_id
+
+    def generate_exit_path(self, v):
+        """取通往 v.end_angle 出口的共享路径编号。"""
+        return self.paths.exit_path(v.end_angle)
+
+    def check_ring_conflict(self, v):
+        """入口是否被环岛车占用：在各车道的角度索引上查询礼让窗口，而不是扫描全部车辆。
+
+        由外向内检查到目标车道为止 (进入内侧车道要穿过外侧车道)，能进入的最内侧车道
+        记为 v.lane；最外侧车道都被占用时判为被挡住。停在停止线前的车从"可以进"变为
+        "被挡住"时记为一次冲突事件，之后持续礼让的每一帧不再重复记录。
+        """
+        scale = self.config['yield_angle']
+        ahead, behind = YIELD_AHEAD * scale, YIELD_BEHIND * scale
+        lane = None
+        for k in range(self.preferred_lane(v) + 1):
+            if self.ring_index.first_in_window(v.start_angle, ahead, behind, k) is not None:
+                break
+            lane = k
+        if lane is not None:
+            v.lane = lane
+            v.yielding = False
+            return False
+
+        if not v.yielding and v.dist_to_center <= STOP_LINE_DISTANCE:
+            v.yielding = True
+            v.conflict_count += 1
+            self.total_conflicts += 1
+            self.telemetry.add_conflict(self.sim_time, v.visual_x, v.visual_y)
+            self.events.emit(CONFLICT, v, self.sim_time)
+        return True
+
+    def get_lead_vehicle(self, v):
+        # 环岛内：由角度索引直接取相邻的前车
+        # 逆时针环岛中前车的角度比我小，(我的角度 - 他的角度) % 2pi 即前向弧长角度
+        if ENTERING <= v.state <= EXITING:
+            return self.ring_index.leader(v, LEAD_WINDOW)
+
+        # 引道上：同一路口队列里紧挨在前面的那辆车
+        if v.state == APPROACHING:
+            return self.approach_queues[v.start_angle].leader(v)
+        return None
+
+    def trip_record(self, v, status):
+        """一辆车的档案行，列见 RECORD_KEYS。"""
+        return {
+            'id': v.id,
+            'type': v.type,
+            'travel_time': round(self.sim_time - v.spawn_time, 2),  # 仿真秒
+            'wait_time': round(v.wait_time, 2),
+            'conflicts': v.conflict_count,
+            'status': status
+        }
+
+    def _record_trip(self, v, sim_time):
+        self.stats_travel_times.append(sim_time - v.spawn_time)
+        self.trips.add(self.trip_record(v, 'completed'))
+
+    def iter_records(self):
+        """已离开车辆的档案 + 仍在场上车辆的当前状态。"""
+        yield from self.trips
+        for v in self.vehicles:
+            yield self.trip_record(v, 'still_in_simulation')
+
+    def collect_records(self):
+        return list(self.iter_records())
+
+    def export_data(self, fmt='csv'):
+        """导出全部车辆档案：已离开车辆 (档案收集器) + 仍在场上的车辆。
+
+        fmt='csv' 写 traffic_analysis_*.csv；fmt='columnar' 按列批量写出二进制档案
+        (有 pyarrow 时为 .parquet，否则为 .npy 列文件目录 .cols)，分析脚本可内存映射读取。
+        """
+        if not len(self.trips) and not self.vehicles:
+            print("没有记录到任何车辆数据，无法导出！")
+            return
+
+        if not os.path.exists('report'):
+            os.makedirs('report')
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = os.path.join('report', f"traffic_analysis_{timestamp}_{int(self.sim_time * 1000)}")
+
+        if fmt == 'columnar':
+            filename = write_columnar(self.iter_records(), filename)
+            print(f"数据已按列导出！共 {len(self.trips) + len(self.vehicles)} 条记录。文件名: {filename}")
+            return filename
+
+        filename += '.csv'
+        try:
+            count = self.trips.finalize(filename, (self.trip_record(v, 'still_in_simulation')
+                                                   for v in self.vehicles))
+            print(f"数据已完整导出！共 {count} 条记录。文件名: {filename}")
+        except PermissionError:
+            print("错误：文件被占用，请先关闭正在查看该 CSV 的 Excel 窗口！")
+        return filename
+
+    def start_recording(self, base_path=None):
+        """开始录制轨迹，默认写入 report/trajectory_<时间戳>.traj/.idx/.json，返回 base_path。"""
+        self.stop_recording()
+        if base_path is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            base_path = os.path.join('report', f'trajectory_{timestamp}')
+        self.recorder = TrajectoryRecorder(base_path, self.dt, ring_lanes=self.ring_lanes,
+                                           lane_radii=[float(r) for r in self.lane_radii])
+        return base_path
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            print(f"轨迹已保存：{self.recorder.frames} 帧，文件名: {self.recorder.base_path}.traj")
+            self.recorder = None
+
+    def close(self):
+        """结束仿真：把尚未写盘的时间序列刷出并关闭后台写盘线程，删除档案溢写文件。"""
+        self.stop_recording()
+        self.profiler.disable()
+        if self.profiler.frames:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = self.profiler.dump(os.path.join('report', f'profile_{timestamp}.json'))
+            self.profiler.reset()
+            print(f"性能剖析已保存至: {filename}")
+        self.telemetry.close()
+        self.trips.close()
+
+    def save_to_csv(self):
+        """导出内存中最近的流量 (每秒均值) 与通行时间数据；完整时间序列见 telemetry 写盘文件。"""
+        # 创建一个带时间戳的文件名，防止覆盖之前的实验
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if not os.path.exists('report'):
+            os.makedirs('report')
+
+        # 1. 保存流量-效率数据
+        flow_filename = os.path.join('report', f'flow_data_{timestamp}.csv')
+        with open(flow_filename, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['Number_of_Vehicles', 'Avg_Speed_Efficiency'])
+            writer.writerows(self.stats_flow_data)
+
+        # 2. 保存最近的通行时间数据 (全部车辆的通行时间见 export_data 的档案)
+        travel_filename = os.path.join('report', f'travel_time_{timestamp}.csv')
+        with open(travel_filename, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['Travel_Time_Seconds'])
+            for t in self.stats_travel_times:
+                writer.writerow([t])
+
+        # 3. 保存冲突热力图网格 (累计次数，每格 HEATMAP_CELL 像素)
+        self.heatmap.save(os.path.join('report', f'conflict_heatmap_{timestamp}.npy'))
+
+        print(f"数据已导出到 CSV 文件！时间戳: {timestamp}")
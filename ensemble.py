@@ -0,0 +1,109 @@
+import argparse
+import numpy as np
+from engine import RoundaboutEngine
+from vehicle_arrays import EnsembleArrays
+
+
+class Ensemble:
+    """K 个相互独立的环岛副本在同一个进程中同步推进。
+
+    每个副本是一个完整的 RoundaboutEngine (自己的随机数流、到达日历、索引、事件与统计)，
+    车辆状态则共用一组 (K, N) 的 EnsembleArrays：每个物理步先逐副本处理到达并找前车，
+    再对全部副本一次性计算 IDM 加速度和环道运动学，最后逐副本执行状态机。
+    每个副本的结果与用同样参数单独运行 RoundaboutEngine(batched_idm=True) 逐位相同。
+    """
+
+    def __init__(self, configs=None, seeds=None, weights=None):
+        if configs is None or isinstance(configs, dict):
+            configs = [configs] * len(seeds or [None])
+        seeds = list(seeds) if seeds is not None else [None] * len(configs)
+        if len(seeds) != len(configs):
+            raise ValueError("configs 与 seeds 的数量必须一致")
+
+        self.arrays = EnsembleArrays(len(configs))
+        self.sims = []
+        for k, (config, seed) in enumerate(zip(configs, seeds)):
+            sim = RoundaboutEngine(config, seed=seed)
+            if weights is not None:
+                sim.weight_aggressive, sim.weight_conservative = weights[k]
+            sim.state_arrays = self.arrays.rows[k]
+            self.sims.append(sim)
+        if len({sim.dt for sim in self.sims}) > 1:
+            raise ValueError("同一个集合中的副本必须使用相同的物理步长")
+
+    def __len__(self):
+        return len(self.sims)
+
+    def __getitem__(self, k):
+        return self.sims[k]
+
+    @property
+    def sim_time(self):
+        return self.sims[0].sim_time
+
+    def step(self):
+        """所有副本同步推进一个物理步 (不跳过空闲期，副本之间始终保持同一时刻)。"""
+        sims = self.sims
+        for sim in sims:
+            if sim.arrivals.next_time <= sim.sim_time:
+                sim.process_arrivals()
+
+        leads = [[sim.get_lead_vehicle(v) for v in sim.vehicles] for sim in sims]
+        self.arrays.sync()
+        lead_slots = np.full((len(sims), self.arrays.width), -1, dtype=np.intp)
+        for k, sim in enumerate(sims):
+            sim.fill_lead_slots(leads[k], lead_slots[k])
+        accels = self.arrays.accelerations(lead_slots)
+        mask, ring_v, ring_angle = self.arrays.ring_kinematics(accels, sims[0].dt)
+
+        for k, sim in enumerate(sims):
+            sim.update(sim.batch_rows(leads[k], accels[k], mask[k], ring_v[k], ring_angle[k]))
+            sim.advance_clock()
+
+    def run_steps(self, n):
+        for _ in range(n):
+            self.step()
+
+    def close(self):
+        for sim in self.sims:
+            sim.close()
+
+
+def run_alone(config, seed, steps):
+    """用同样的参数单独运行一个副本 (批量 IDM 路径)，用于核对集合结果。"""
+    sim = RoundaboutEngine(config, batched_idm=True, seed=seed)
+    for _ in range(steps):
+        sim.step()
+    # 关闭会删除档案的溢写文件，必须先取出全部档案
+    result = list(sim.trips), sim.total_conflicts
+    sim.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在一个进程中同步运行 K 个独立副本 (共用批量状态数组)")
+    parser.add_argument('--replicas', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0, help="第一个副本的种子，其余依次加 1")
+    parser.add_argument('--duration', type=float, default=600.0, help="仿真时长 (仿真秒)")
+    parser.add_argument('--check', action='store_true', help="逐个单独重跑并核对车辆档案是否逐位相同")
+    args = parser.parse_args()
+
+    seeds = list(range(args.seed, args.seed + args.replicas))
+    ensemble = Ensemble(seeds=seeds)
+    steps = int(round(args.duration / ensemble[0].dt))
+    ensemble.run_steps(steps)
+    # 核对用的档案在关闭 (删除溢写文件) 之前取出
+    results = [(list(sim.trips), sim.total_conflicts) for sim in ensemble.sims] if args.check else None
+    ensemble.close()
+
+    for seed, sim in zip(seeds, ensemble.sims):
+        n, mean, std, p50, p90 = sim.stats.summary('all', 'travel_time')
+        print(f"seed {seed:>4}: 完成 {n} 辆, 通行时间 {mean:.2f} ± {std:.2f} s, 冲突 {sim.total_conflicts}")
+
+    if args.check:
+        mismatched = [seed for seed, result in zip(seeds, results) if run_alone(None, seed, steps) != result]
+        print("核对通过：每个副本与单独运行的结果相同" if not mismatched else f"结果不一致的种子: {mismatched}")
+
+
+if __name__ == "__main__":
+    main()
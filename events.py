@@ -0,0 +1,23 @@
+# 车辆生命周期事件：每辆车每种事件只发出一次 (CONFLICT 每次冲突发出一次)
+SPAWN = "spawn"  # 进入引道
+ENTER_RING = "enter_ring"  # 越过停止线开始汇入环岛
+EXIT_RING = "exit_ring"  # 驶离环岛进入出口直道
+DESPAWN = "despawn"  # 离开画面，从仿真中移除
+CONFLICT = "conflict"  # 在停止线前被环岛车挡住 (每次礼让只发出一次)
+
+
+class EventBus:
+    """同步事件分发：订阅者按注册顺序被调用，参数为 (车辆, 仿真时间)。"""
+
+    def __init__(self):
+        self._subscribers = {}
+
+    def subscribe(self, event, callback):
+        self._subscribers.setdefault(event, []).append(callback)
+
+    def unsubscribe(self, event, callback):
+        self._subscribers.get(event, []).remove(callback)
+
+    def emit(self, event, vehicle, sim_time):
+        for callback in self._subscribers.get(event, ()):
+            callback(vehicle, sim_time)
@@ -0,0 +1,79 @@
+import math
+import numpy as np
+from events import CONFLICT
+
+RENORMALIZE_AT = 1e150  # 衰减网格的放大系数超过此值时整体缩回，避免浮点溢出
+RENORMALIZE_EXPONENT = math.log2(RENORMALIZE_AT)  # 比较指数而不是放大系数：长时间无冲突时 2 ** e 本身就会溢出
+
+
+class ConflictHeatmap:
+    """冲突点在固定分辨率网格上的在线累计。
+
+    场景 (size x size 像素) 按 cell 像素一格划分，counts[row, col] 为该格累计冲突次数，
+    每次冲突 O(1)，内存只取决于网格大小而与运行时长无关。
+    给定 half_life (仿真秒) 时另维护一张按指数衰减的 "近期冲突" 网格：
+    不逐步衰减整张网格，而是把新样本按 2^((t - t0) / half_life) 放大后累加，
+    读取时再整体乘回衰减因子，所以衰减同样不随网格大小增加每步开销。
+    """
+
+    def __init__(self, size=800, cell=10, half_life=None):
+        self.size = size
+        self.cell = cell
+        self.bins = int(math.ceil(size / cell))
+        self.counts = np.zeros((self.bins, self.bins), dtype=np.int32)
+        self.total = 0
+        self.half_life = half_life
+        self.recent_grid = np.zeros((self.bins, self.bins), dtype=np.float64) if half_life else None
+        self._t0 = 0.0  # recent_grid 的参考时间
+
+    def attach(self, events):
+        events.subscribe(CONFLICT, self.on_conflict)
+
+    def on_conflict(self, v, sim_time):
+        self.add(v.visual_x, v.visual_y, sim_time)
+
+    def add(self, x, y, sim_time=0.0):
+        col, row = int(x // self.cell), int(y // self.cell)
+        if not (0 <= col < self.bins and 0 <= row < self.bins):
+            return
+        self.counts[row, col] += 1
+        self.total += 1
+        if self.recent_grid is not None:
+            exponent = (sim_time - self._t0) / self.half_life
+            if exponent > RENORMALIZE_EXPONENT:
+                # 缩回的系数可能下溢为 0，此时早先的冲突本来就已衰减到可以忽略
+                self.recent_grid *= 2.0 ** -exponent
+                self._t0 = sim_time
+                scale = 1.0
+            else:
+                scale = 2.0 ** exponent
+            self.recent_grid[row, col] += scale
+
+    def recent(self, sim_time):
+        """sim_time 时刻的衰减网格 (每个冲突的权重随时间按半衰期减半)。"""
+        if self.recent_grid is None:
+            raise ValueError("未设置 half_life，没有近期冲突网格")
+        exponent = (sim_time - self._t0) / self.half_life
+        return self.recent_grid * 2.0 ** -exponent
+
+    def grid(self, sim_time=None):
+        """sim_time 为 None 时返回累计计数，否则返回该时刻的衰减网格。"""
+        return self.counts if sim_time is None else self.recent(sim_time)
+
+    @property
+    def extent(self):
+        """imshow 用的坐标范围 (左, 右, 下, 上)，y 轴向下与 pygame 一致。"""
+        span = self.bins * self.cell
+        return [0, span, span, 0]
+
+    def save(self, path, sim_time=None):
+        """把网格保存为一个 .npy 数组 (行 = y 方向，列 = x 方向，每格 cell 像素)。"""
+        np.save(path, self.grid(sim_time))
+        return path if path.endswith('.npy') else path + '.npy'
+
+    def reset(self):
+        self.counts[:] = 0
+        self.total = 0
+        if self.recent_grid is not None:
+            self.recent_grid[:] = 0.0
+
@@ -0,0 +1,49 @@
+import pygame
+
+_FONT_CACHE = {}
+
+
+def get_font(name, size):
+    """SysFont 查找很慢，同一字体只加载一次。"""
+    key = (name, size)
+    font = _FONT_CACHE.get(key)
+    if font is None:
+        font = _FONT_CACHE[key] = pygame.font.SysFont(name, size)
+    return font
+
+
+class HudPanel:
+    """半透明信息面板。
+
+    背景板只创建一次；每行文字按 key 缓存渲染结果，只有内容变化时才重新渲染。
+    refresh_ms > 0 的行 (如平均速度这类每帧都在变的指标) 最多每 refresh_ms 毫秒刷新一次，
+    此时 text 可以传入函数，未到刷新时间就不会去计算它。
+    """
+
+    def __init__(self, pos, size, fill, alpha=180, border=None):
+        self.pos = pos
+        self.size = size
+        self.border = border
+        self.overlay = pygame.Surface(size)
+        self.overlay.set_alpha(alpha)
+        self.overlay.fill(fill)
+        self._lines = {}  # key -> [text, surface, offset, 上次渲染时刻]
+
+    def set_text(self, key, text, font, color, offset, refresh_ms=0):
+        now = pygame.time.get_ticks()
+        entry = self._lines.get(key)
+        if entry is not None and refresh_ms and now - entry[3] < refresh_ms:
+            return
+        if callable(text):
+            text = text()
+        if entry is not None and entry[0] == text:
+            entry[3] = now
+            return
+        self._lines[key] = [text, font.render(text, True, color), offset, now]
+
+    def draw(self, screen):
+        x, y = self.pos
+        screen.blit(self.overlay, self.pos)
+        if self.border:
+            pygame.draw.rect(screen, self.border, (x, y, self.size[0], self.size[1]), 2)
+        screen.blits([(surface, (x + ox, y + oy)) for _, surface, (ox, oy), _ in self._lines.values()], False)
@@ -0,0 +1,224 @@
+import math
+from events import SPAWN, ENTER_RING, DESPAWN, CONFLICT
+
+METRICS = ('travel_time', 'wait_time', 'conflicts')  # 每辆离场车辆记录一次的指标
+SKETCHED = ('travel_time', 'wait_time')  # 额外维护分位数草图的指标
+COUNTERS = ('spawned', 'entered', 'completed', 'conflict_events')
+
+
+class RunningStats:
+    """Welford 在线均值/方差，O(1) 更新，可与其他实例合并 (Chan 并行公式)。"""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+
+    @property
+    def variance(self):
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def merge(self, other):
+        if other.n == 0:
+            return self
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def to_dict(self):
+        return {'n': self.n, 'mean': self.mean, 'm2': self.m2,
+                'min': self.min if self.n else None, 'max': self.max if self.n else None}
+
+    @classmethod
+    def from_dict(cls, d):
+        s = cls()
+        s.n, s.mean, s.m2 = d['n'], d['mean'], d['m2']
+        if s.n:
+            s.min, s.max = d['min'], d['max']
+        return s
+
+
+class QuantileSketch:
+    """对数分桶的可合并分位数草图 (非负数据)。
+
+    第 k 个桶覆盖 (gamma^(k-1), gamma^k]，gamma = (1+alpha)/(1-alpha)，
+    任意分位数的相对误差不超过 alpha；插入 O(1)，合并即桶计数相加，
+    桶数只随数据的数量级范围增长而与样本数无关。
+    """
+
+    MIN_VALUE = 1e-9  # 小于此值的样本计入零桶
+
+    def __init__(self, alpha=0.01):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, x):
+        self.count += 1
+        if x <= self.MIN_VALUE:
+            self.zeros += 1
+            return
+        k = math.ceil(math.log(x) / self._log_gamma)
+        self.bins[k] = self.bins.get(k, 0) + 1
+
+    def quantile(self, q):
+        if not self.count:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for k in sorted(self.bins):
+            seen += self.bins[k]
+            if seen > rank:
+                return 2 * self.gamma ** k / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def merge(self, other):
+        if other.alpha != self.alpha:
+            raise ValueError("只能合并相同精度 (alpha) 的分位数草图")
+        for k, c in other.bins.items():
+            self.bins[k] = self.bins.get(k, 0) + c
+        self.zeros += other.zeros
+        self.count += other.count
+        return self
+
+    def to_dict(self):
+        return {'alpha': self.alpha, 'zeros': self.zeros, 'count': self.count,
+                'bins': {str(k): c for k, c in self.bins.items()}}
+
+    @classmethod
+    def from_dict(cls, d):
+        s = cls(d['alpha'])
+        s.zeros, s.count = d['zeros'], d['count']
+        s.bins = {int(k): c for k, c in d['bins'].items()}
+        return s
+
+
+class GroupStats:
+    """一个分组 (全体 / 某车型 / 某路口) 的计数、指标均值方差与分位数草图。"""
+
+    def __init__(self, alpha=0.01):
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self.metrics = {m: RunningStats() for m in METRICS}
+        self.sketches = {m: QuantileSketch(alpha) for m in SKETCHED}
+
+    def merge(self, other):
+        for key in COUNTERS:
+            self.counts[key] += other.counts[key]
+        for m in METRICS:
+            self.metrics[m].merge(other.metrics[m])
+        for m in SKETCHED:
+            self.sketches[m].merge(other.sketches[m])
+        return self
+
+    def to_dict(self):
+        return {'counts': dict(self.counts),
+                'metrics': {m: s.to_dict() for m, s in self.metrics.items()},
+                'sketches': {m: s.to_dict() for m, s in self.sketches.items()}}
+
+    @classmethod
+    def from_dict(cls, d):
+        g = cls()
+        g.counts = dict(d['counts'])
+        g.metrics = {m: RunningStats.from_dict(s) for m, s in d['metrics'].items()}
+        g.sketches = {m: QuantileSketch.from_dict(s) for m, s in d['sketches'].items()}
+        return g
+
+
+class StreamingStats:
+    """由车辆生命周期事件驱动的在线统计，按 'all'、'type:<车型>'、'arm:<路口序号>' 分组。
+
+    每个事件只更新该车所属的三个分组，O(1)；to_dict/from_dict/merge 用于
+    把多个进程 (参数扫描、重复实验) 的结果合并成总体统计。
+    """
+
+    def __init__(self, directions=(), alpha=0.01):
+        self.directions = list(directions)  # 路口角度 -> 序号
+        self.alpha = alpha
+        self.groups = {}
+
+    def attach(self, events):
+        events.subscribe(SPAWN, self.on_spawn)
+        events.subscribe(ENTER_RING, self.on_enter)
+        events.subscribe(DESPAWN, self.on_despawn)
+        events.subscribe(CONFLICT, self.on_conflict)
+
+    def group(self, key):
+        g = self.groups.get(key)
+        if g is None:
+            g = self.groups[key] = GroupStats(self.alpha)
+        return g
+
+    def _groups_of(self, v):
+        return (self.group('all'), self.group(f'type:{v.type}'),
+                self.group(f'arm:{self.directions.index(v.start_angle)}'))
+
+    def on_spawn(self, v, sim_time):
+        for g in self._groups_of(v):
+            g.counts['spawned'] += 1
+
+    def on_enter(self, v, sim_time):
+        for g in self._groups_of(v):
+            g.counts['entered'] += 1
+
+    def on_conflict(self, v, sim_time):
+        for g in self._groups_of(v):
+            g.counts['conflict_events'] += 1
+
+    def on_despawn(self, v, sim_time):
+        values = {'travel_time': sim_time - v.spawn_time, 'wait_time': v.wait_time, 'conflicts': v.conflict_count}
+        for g in self._groups_of(v):
+            g.counts['completed'] += 1
+            for m in METRICS:
+                g.metrics[m].add(values[m])
+            for m in SKETCHED:
+                g.sketches[m].add(values[m])
+
+    def summary(self, key, metric):
+        """(样本数, 均值, 标准差, p50, p90)；分组不存在时样本数为 0。"""
+        g = self.groups.get(key)
+        if g is None or not g.metrics[metric].n:
+            return 0, math.nan, math.nan, math.nan, math.nan
+        s = g.metrics[metric]
+        sketch = g.sketches.get(metric)
+        p50, p90 = (sketch.quantile(0.5), sketch.quantile(0.9)) if sketch else (math.nan, math.nan)
+        return s.n, s.mean, s.std, p50, p90
+
+    def merge(self, other):
+        for key, g in other.groups.items():
+            self.group(key).merge(g)
+        return self
+
+    def to_dict(self):
+        return {'alpha': self.alpha, 'groups': {key: g.to_dict() for key, g in self.groups.items()}}
+
+    @classmethod
+    def from_dict(cls, d):
+        s = cls(alpha=d['alpha'])
+        s.groups = {key: GroupStats.from_dict(g) for key, g in d['groups'].items()}
+        return s
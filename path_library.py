@@ -0,0 +1,109 @@
+import numpy as np
+
+PATH_POINTS = 100  # 每条贝塞尔路径的采样点数
+EXIT_TRIGGER = 0.25  # 距出口 0.25 弧度内开始驶出 (与 update 中的判定一致)
+ENTRY_SHIFT = 0.35  # 入口汇入点相对路口角度往下游挪约 20 度
+
+
+class PathLibrary:
+    """入口/出口二次贝塞尔路径表，按路口/出口各计算一次，所有车辆共享。
+
+    所有路径存放在同一组连续数组中，形状为 (路径数, PATH_POINTS)：
+    points 为坐标，heading 为指向下一个点的朝向，polar_angle / radius 为相对
+    环岛中心的极坐标，arc_length 为从起点累计的弧长。车辆只保存路径编号和
+    path_index，沿路径行驶时直接查表。
+    """
+
+    def __init__(self, center, ring_r, lane_offset, lane_width=25):
+        self.center = center
+        self.ring_r = ring_r
+        self.lane_offset = lane_offset
+        self.lane_width = lane_width
+        self._ids = {}
+        self.points = np.empty((0, PATH_POINTS, 2))
+        self.heading = np.empty((0, PATH_POINTS))
+        self.polar_angle = np.empty((0, PATH_POINTS))
+        self.radius = np.empty((0, PATH_POINTS))
+        self.arc_length = np.empty((0, PATH_POINTS))
+
+    @staticmethod
+    def _bezier(p0, p1, p2):
+        t = np.linspace(0, 1, PATH_POINTS)[:, None]
+        return (1 - t) ** 2 * p0 + 2 * (1 - t) * t * p1 + t ** 2 * p2
+
+    def _add(self, key, pts):
+        d = np.diff(pts, axis=0)
+        heading = np.empty(PATH_POINTS)
+        heading[:-1] = np.arctan2(d[:, 1], d[:, 0])
+        heading[-1] = heading[-2]
+        rel = pts - self.center
+        arc = np.concatenate(([0.0], np.cumsum(np.hypot(d[:, 0], d[:, 1]))))
+
+        self.points = np.concatenate((self.points, pts[None]))
+        self.heading = np.concatenate((self.heading, heading[None]))
+        self.polar_angle = np.concatenate((self.polar_angle, np.arctan2(rel[:, 1], rel[:, 0])[None]))
+        self.radius = np.concatenate((self.radius, np.sqrt(rel[:, 0] ** 2 + rel[:, 1] ** 2)[None]))
+        self.arc_length = np.concatenate((self.arc_length, arc[None]))
+        self._ids[key] = len(self._ids)
+        return self._ids[key]
+
+    @property
+    def keys(self):
+        """按编号顺序排列的路径键，如 ('entry', 角度, 车道)、('exit', 角度)。"""
+        return list(self._ids)
+
+    def build(self, keys):
+        """按给定顺序生成路径，使路径编号与另一个按同样顺序生成的路径表一致 (快照恢复用)。"""
+        for key in keys:
+            if key[0] == 'entry':
+                self.entry_path(key[1], key[2])
+            else:
+                self.exit_path(key[1])
+
+    def lane_radius(self, lane):
+        """环道 lane 的行车半径：0 为最外侧车道 (ring_r + lane_offset)，往内每条车道减 lane_width。"""
+        return self.ring_r + self.lane_offset - lane * self.lane_width
+
+    def entry_path(self, start_angle, lane=0):
+        """从 start_angle 路口停止线切入第 lane 条环道的路径编号。"""
+        key = ('entry', start_angle, lane)
+        if key in self._ids:
+            return self._ids[key]
+        c, off = self.center, self.lane_offset
+        target_r = self.lane_radius(lane)
+
+        # 起点 P0: 当前车道的右侧边缘；终点 P2: 往下游挪约 20 度，让车子斜着切入
+        p0 = np.array([
+            c + (self.ring_r + 40) * np.cos(start_angle) + off * np.cos(start_angle - np.pi / 2),
+            c + (self.ring_r + 40) * np.sin(start_angle) + off * np.sin(start_angle - np.pi / 2)
+        ])
+        entry_angle = start_angle - ENTRY_SHIFT
+        p2 = np.array([c + target_r * np.cos(entry_angle), c + target_r * np.sin(entry_angle)])
+        # 控制点 P1: 位于 P0 的正前方，确保车子先直行一小段
+        p1 = p0 + np.array([-np.cos(start_angle), -np.sin(start_angle)]) * 25
+        return self._add(key, self._bezier(p0, p1, p2))
+
+    def exit_path(self, end_angle):
+        """从最外侧车道驶出到 end_angle 出口直线车道的路径编号。
+
+        起点固定为触发驶出时的位置 (出口上游 EXIT_TRIGGER 弧度)；车辆实际触发
+        位置与之相差不到一个物理步的行驶距离。
+        """
+        key = ('exit', end_angle)
+        if key in self._ids:
+            return self._ids[key]
+        c, off = self.center, self.lane_offset
+        start = end_angle + EXIT_TRIGGER
+        p0 = np.array([c + (self.ring_r + off) * np.cos(start), c + (self.ring_r + off) * np.sin(start)])
+
+        # P1: 沿切线方向 (逆时针环岛中为 角度 - pi/2) 延伸 20 像素
+        tangent = start - np.pi / 2
+        p1 = p0 + np.array([20 * np.cos(tangent), 20 * np.sin(tangent)])
+
+        # P2: 最终驶入直线车道的靠右点 (R + 100 处)
+        target_r = self.ring_r + 100
+        p2 = np.array([
+            c + target_r * np.cos(end_angle) - off * np.sin(end_angle),
+            c + target_r * np.sin(end_angle) + off * np.cos(end_angle)
+        ])
+        return self._add(key, self._bezier(p0, p1, p2))
@@ -0,0 +1,134 @@
+import os
+import json
+import time
+from collections import deque
+import numpy as np
+
+
+class PhaseProfiler:
+    """主循环与 update() 内部各阶段的耗时统计。
+
+    关闭时不做任何事：被测方法保持原样，只有 enable() 之后才在实例上用计时包装
+    遮住同名方法，disable() 时删除包装，所以可以常驻在正式版本里。
+    每帧内同一阶段的耗时累加，end_frame() 时写入最近 window 帧的滚动窗口
+    (本帧没有运行的阶段不记录)；derived 阶段由 "总耗时 - 子阶段" 在帧末算出。
+    """
+
+    def __init__(self, owner, phases, derived=None, window=600):
+        self.owner = owner
+        self.phases = dict(phases)  # 方法名 -> 阶段名
+        self.derived = dict(derived or {})  # 阶段名 -> (总阶段, [子阶段, ...])
+        self.window = window
+        self.enabled = False
+        self.frames = 0
+        self.history = {}  # 阶段名 -> deque(每帧毫秒数)
+        self.totals = {}  # 阶段名 -> 累计秒数 (全程)
+        self._current = {}
+        self._last = None
+
+    def enable(self):
+        if self.enabled:
+            return
+        for name, label in self.phases.items():
+            setattr(self.owner, name, self._timed(getattr(self.owner, name), label))
+        self.enabled = True
+        self._last = time.perf_counter()
+
+    def disable(self):
+        if not self.enabled:
+            return
+        for name in self.phases:
+            self.owner.__dict__.pop(name, None)
+        self.enabled = False
+        self._current.clear()
+
+    def toggle(self):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+
+    def _timed(self, fn, label):
+        clock = time.perf_counter
+        current = self._current
+
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                current[label] = current.get(label, 0.0) + clock() - start
+        return timed
+
+    def reset(self):
+        """清空已记录的统计 (开关状态不变)。"""
+        self.frames = 0
+        self.history.clear()
+        self.totals.clear()
+        self._current.clear()
+
+    def add(self, label, seconds):
+        """手动记录一段耗时 (用于不是方法调用的阶段，如 display.flip)。"""
+        self._current[label] = self._current.get(label, 0.0) + seconds
+
+    def end_frame(self):
+        """结束一帧：把本帧各阶段耗时写入滚动窗口。"""
+        now = time.perf_counter()
+        current = self._current
+        current['frame'] = now - self._last
+        self._last = now
+        for label, (total, parts) in self.derived.items():
+            if total in current:
+                current[label] = max(0.0, current[total] - sum(current.get(p, 0.0) for p in parts))
+
+        for label, seconds in current.items():
+            history = self.history.get(label)
+            if history is None:
+                history = self.history[label] = deque(maxlen=self.window)
+            history.append(seconds * 1000.0)
+            self.totals[label] = self.totals.get(label, 0.0) + seconds
+        current.clear()
+        self.frames += 1
+
+    def percentiles(self, q=(50, 95, 99)):
+        """{阶段名: {'p50': 毫秒, ..., 'max': 毫秒}}，基于最近 window 帧。"""
+        stats = {}
+        for label, history in self.history.items():
+            values = np.fromiter(history, np.float64, len(history))
+            row = {f'p{p}': float(v) for p, v in zip(q, np.percentile(values, q))}
+            row['max'] = float(values.max())
+            stats[label] = row
+        return stats
+
+    def rows(self):
+        """HUD 用的表格行：[(阶段名, p50, p95, max), ...]，单位毫秒。"""
+        stats = self.percentiles((50, 95))
+        return [(label, stats[label]['p50'], stats[label]['p95'], stats[label]['max'])
+                for label in self._order() if label in stats]
+
+    def _order(self):
+        # 派生阶段紧跟在它的最后一个子阶段之后，整帧耗时放在最后
+        labels = list(self.phases.values())
+        for label, (total, parts) in self.derived.items():
+            anchor = parts[-1] if parts and parts[-1] in labels else total
+            labels.insert(labels.index(anchor) + 1 if anchor in labels else len(labels), label)
+        labels += [label for label in self.history if label not in labels and label != 'frame']
+        return labels + ['frame']
+
+    def dump(self, filename):
+        """把滚动百分位与全程累计耗时写成 JSON。"""
+        directory = os.path.dirname(filename)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        frame_total = self.totals.get('frame', 0.0)
+        stats = self.percentiles()
+        report = {
+            'frames': self.frames,
+            'window': self.window,
+            'phases': {label: dict(stats[label], total_seconds=self.totals[label],
+                                   share=self.totals[label] / frame_total if frame_total else 0.0)
+                       for label in self._order() if label in stats},
+        }
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return filename
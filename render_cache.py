@@ -0,0 +1,52 @@
+from collections import OrderedDict
+import pygame
+
+CAR_LENGTH = 24
+CAR_WIDTH = 14
+CAR_COLORS = {"aggressive": (200, 30, 30), "conservative": (30, 80, 200)}  # 深红/深蓝
+
+
+def make_car_sprite(v_type):
+    """画出车头朝右 (0 度) 的长方形车身贴图。"""
+    car_surface = pygame.Surface((CAR_LENGTH, CAR_WIDTH), pygame.SRCALPHA)
+    color = CAR_COLORS.get(v_type, CAR_COLORS["conservative"])
+    # 画车身矩形
+    pygame.draw.rect(car_surface, color, (0, 0, CAR_LENGTH, CAR_WIDTH), border_radius=3)
+    # 画一个深色矩形代表前挡风玻璃（区分车头车尾）
+    pygame.draw.rect(car_surface, (50, 50, 50), (CAR_LENGTH - 8, 2, 6, CAR_WIDTH - 4))
+    return car_surface
+
+
+class SpriteCache:
+    """按 (车型, 量化角度) 缓存旋转后的车辆贴图。
+
+    角度按 angle_step 度取整，贴图第一次用到时才旋转生成；
+    超过 max_size 张时淘汰最久未使用的贴图。
+    """
+
+    def __init__(self, angle_step=2, max_size=512):
+        self.angle_step = angle_step
+        self.max_size = max_size
+        self._steps = max(1, round(360 / angle_step))
+        self._base = {}
+        self._rotated = OrderedDict()
+
+    def __len__(self):
+        return len(self._rotated)
+
+    def get(self, v_type, angle_deg):
+        """返回逆时针旋转 angle_deg 度 (pygame 约定) 后的车辆贴图。"""
+        key = (v_type, int(round(angle_deg / self.angle_step)) % self._steps)
+        sprite = self._rotated.get(key)
+        if sprite is not None:
+            self._rotated.move_to_end(key)
+            return sprite
+
+        base = self._base.get(v_type)
+        if base is None:
+            base = self._base[v_type] = make_car_sprite(v_type)
+        sprite = pygame.transform.rotate(base, key[1] * self.angle_step)
+        self._rotated[key] = sprite
+        if len(self._rotated) > self.max_size:
+            self._rotated.popitem(last=False)
+        return sprite
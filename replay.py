@@ -0,0 +1,119 @@
+import os
+import sys
+import glob
+import pygame
+from simulation import AdvancedSim
+from trajectory import TrajectoryLog
+from hud import HudPanel, get_font
+
+SPEEDS = [0.25, 0.5, 1, 2, 4, 8, 16, 32]  # 回放倍速档位
+SEEK_STEP = 5.0  # 左右方向键跳转的仿真秒数
+SEEK_STEP_LONG = 60.0  # PageUp/PageDown 跳转的仿真秒数
+
+
+class ReplayViewer(AdvancedSim):
+    """轨迹回放：直接从 TrajectoryLog 取每帧位姿交给 draw_vehicles，不运行 update()。
+
+    空格暂停/继续，上下方向键切换倍速 (0.25x ~ 32x)，左右方向键 / PageUp / PageDown 跳转，
+    Home/End 跳到开头/结尾，点击底部进度条跳到对应位置。
+    """
+
+    def __init__(self, log_path):
+        self.log = TrajectoryLog(log_path)
+        # 回放不产生新的仿真数据，不写遥测文件；路网按录制时的车道数绘制
+        super().__init__({'ring_lanes': self.log.ring_lanes}, telemetry_dir=None)
+        self.position = 0.0  # 当前回放位置 (仿真秒)
+        self.speed_index = SPEEDS.index(1)
+        self.paused = False
+        self.replay_panel = HudPanel((10, 10), (300, 110), (40, 40, 40))
+        self.bar_rect = pygame.Rect(20, self.screen.get_height() - 30, self.screen.get_width() - 40, 10)
+        pygame.display.set_caption(f"Replay - {os.path.basename(self.log.base_path)}")
+
+    @property
+    def frame_index(self):
+        return min(len(self.log) - 1, int(self.position / self.log.dt))
+
+    def seek(self, position):
+        self.position = min(max(0.0, position), self.log.duration)
+
+    def handle_events(self):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return False
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and self.bar_rect.collidepoint(event.pos):
+                self.seek((event.pos[0] - self.bar_rect.x) / self.bar_rect.width * self.log.duration)
+            if event.type != pygame.KEYDOWN:
+                continue
+            if event.key == pygame.K_SPACE:
+                self.paused = not self.paused
+            elif event.key == pygame.K_UP:
+                self.speed_index = min(len(SPEEDS) - 1, self.speed_index + 1)
+            elif event.key == pygame.K_DOWN:
+                self.speed_index = max(0, self.speed_index - 1)
+            elif event.key == pygame.K_RIGHT:
+                self.seek(self.position + SEEK_STEP)
+            elif event.key == pygame.K_LEFT:
+                self.seek(self.position - SEEK_STEP)
+            elif event.key == pygame.K_PAGEUP:
+                self.seek(self.position + SEEK_STEP_LONG)
+            elif event.key == pygame.K_PAGEDOWN:
+                self.seek(self.position - SEEK_STEP_LONG)
+            elif event.key == pygame.K_HOME:
+                self.seek(0.0)
+            elif event.key == pygame.K_END:
+                self.seek(self.log.duration)
+        return True
+
+    def draw_replay_hud(self):
+        panel = self.replay_panel
+        font = get_font("Arial", 18)
+        frame = self.frame_index
+        lines = [
+            f"Replay {self.position:.1f} / {self.log.duration:.1f} s",
+            f"Vehicles: {len(self.log.frame(frame))}",
+            f"Speed: {SPEEDS[self.speed_index]}x" + ("  [PAUSED]" if self.paused else ""),
+            "SPACE pause  UP/DOWN speed  LEFT/RIGHT seek",
+        ]
+        for i, text in enumerate(lines):
+            panel.set_text(i, text, font if i < 3 else get_font("Arial", 14), (255, 255, 255), (10, 10 + i * 25))
+        panel.draw(self.screen)
+
+        # 进度条
+        pygame.draw.rect(self.screen, (80, 80, 80), self.bar_rect)
+        done = self.bar_rect.copy()
+        done.width = int(self.bar_rect.width * self.position / max(self.log.duration, 1e-9))
+        pygame.draw.rect(self.screen, (0, 200, 255), done)
+
+    def run(self):
+        if not len(self.log):
+            print("轨迹文件中没有任何帧。")
+            return
+        try:
+            while self.handle_events():
+                real_dt = self.clock.tick(60) / 1000.0
+                if not self.paused:
+                    self.seek(self.position + real_dt * SPEEDS[self.speed_index])
+
+                self.draw_vehicles(self.log.poses(self.frame_index))
+                self.draw_replay_hud()
+                pygame.display.flip()
+        finally:
+            self.close()
+            pygame.quit()
+
+
+def main():
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        # 默认回放 report 文件夹中最新的轨迹
+        files = glob.glob(os.path.join('report', 'trajectory_*.traj'))
+        if not files:
+            print("❌ 未找到轨迹文件。请在仿真界面按 R 键录制，或指定 .traj 文件路径。")
+            return
+        path = max(files, key=os.path.getmtime)
+    ReplayViewer(path).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import math
+from bisect import bisect_left
+
+TWO_PI = 2 * math.pi
+
+
+class RingIndex:
+    """按角度排序的环岛车辆索引 (ENTERING / CIRCULATING / EXITING)。
+
+    键为 (角度 % 2pi, 生成序号)，生成序号保证角度相同时的先后顺序与
+    self.vehicles 一致。车辆移动时就地更新，只有越过相邻车辆时才重新插入。
+    """
+
+    def __init__(self):
+        self._keys = []  # 有序的 (angle, seq)
+        self._items = []  # 与 _keys 一一对应的车辆
+        self._key_of = {}  # 车辆 -> 当前键
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, v):
+        return v in self._key_of
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def _index_of(self, v):
+        key = self._key_of[v]
+        i = bisect_left(self._keys, key)
+        while self._items[i] is not v:
+            i += 1
+        return i
+
+    def update(self, v):
+        """车辆进入环岛或角度变化后调用，保持索引有序。"""
+        key = (v.current_angle % TWO_PI, v.seq)
+        old = self._key_of.get(v)
+        if old is None:
+            i = bisect_left(self._keys, key)
+            self._keys.insert(i, key)
+            self._items.insert(i, v)
+            self._key_of[v] = key
+            return
+        if old == key:
+            return
+
+        i = self._index_of(v)
+        keys = self._keys
+        # 绝大多数情况下车辆不会越过相邻车辆，直接替换键即可
+        if (i == 0 or keys[i - 1] < key) and (i == len(keys) - 1 or key < keys[i + 1]):
+            keys[i] = key
+        else:
+            del keys[i]
+            del self._items[i]
+            j = bisect_left(keys, key)
+            keys.insert(j, key)
+            self._items.insert(j, v)
+        self._key_of[v] = key
+
+    def remove(self, v):
+        if v not in self._key_of:
+            return
+        i = self._index_of(v)
+        del self._keys[i]
+        del self._items[i]
+        del self._key_of[v]
+
+    def leader(self, v, window):
+        """返回 v 前方 (角度更小方向) window 弧度内最近的车，没有则返回 None。
+
+        与逐车扫描的结果一致：距离为 0 的车不算前车，距离相同取生成顺序靠前者。
+        """
+        keys = self._keys
+        if not keys:
+            return None
+        angle = v.current_angle % TWO_PI
+
+        # 角度严格小于我的最近一辆；没有则绕回到角度最大的那辆
+        i = bisect_left(keys, (angle, -1)) - 1
+        cand_angle = keys[i][0]  # i == -1 时即为绕回
+        if cand_angle == angle:
+            return None
+        # 同一角度上有多辆车时取生成序号最小者
+        cand = self._items[bisect_left(keys, (cand_angle, -1))]
+
+        d_angle = (v.current_angle - cand.current_angle) % TWO_PI
+        if 0 < d_angle < window:
+            return cand
+        return None
+
+    def first_in_window(self, angle, ahead, behind):
+        """返回角度落在 [angle - ahead, angle + behind] 附近窗口内的任意一辆车。
+
+        判定与 d = (angle - 车辆角度) % 2pi 满足 d < ahead 或 d > 2pi - behind 一致；
+        只检查从窗口起点开始按角度排列的少数几辆车。
+        """
+        keys = self._keys
+        n = len(keys)
+        if n == 0:
+            return None
+        lo = (angle - ahead) % TWO_PI
+        span = ahead + behind
+        start = bisect_left(keys, (lo, -1))
+        for k in range(n):
+            i = (start + k) % n
+            if (keys[i][0] - lo) % TWO_PI > span + 1e-9:
+                break
+            other = self._items[i]
+            d_angle = (angle - other.current_angle) % TWO_PI
+            if d_angle < ahead or d_angle > TWO_PI - behind:
+                return other
+        return None
+
+
+class LaneRingIndex:
+    """多车道环岛的占用索引：每条环道一个 RingIndex，按 v.lane 分派 (0 为最外侧车道)。
+
+    车辆换道后再次 update 即从原车道移到新车道；前车查找只看本车道，
+    入口礼让只查询需要穿过的车道。
+    """
+
+    def __init__(self, lanes=1):
+        self.lanes = [RingIndex() for _ in range(lanes)]
+        self._lane_of = {}  # 车辆 -> 当前所在车道
+
+    def __len__(self):
+        return len(self._lane_of)
+
+    def __contains__(self, v):
+        return v in self._lane_of
+
+    def __iter__(self):
+        for lane in self.lanes:
+            yield from lane
+
+    def update(self, v):
+        old = self._lane_of.get(v)
+        if old is not None and old != v.lane:
+            self.lanes[old].remove(v)
+        self._lane_of[v] = v.lane
+        self.lanes[v.lane].update(v)
+
+    def remove(self, v):
+        lane = self._lane_of.pop(v, None)
+        if lane is not None:
+            self.lanes[lane].remove(v)
+
+    def leader(self, v, window):
+        return self.lanes[v.lane].leader(v, window)
+
+    def first_in_window(self, angle, ahead, behind, lane=0):
+        return self.lanes[lane].first_in_window(angle, ahead, behind)
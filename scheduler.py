@@ -0,0 +1,69 @@
+import time
+
+SPEED_MULTIPLIERS = [1, 10, 100, None]  # None 表示不限速 (max)
+
+
+class FixedStepScheduler:
+    """固定物理步长的时间推进器，把物理更新与渲染帧率解耦。
+
+    每帧把经过的真实时间 * 倍速累加进 accumulator，再按 dt 整步消耗，
+    所以 1x 时仿真秒与真实秒一致，与帧率无关。每帧最多执行 max_substeps 步，
+    跟不上时丢弃积压而不是越积越多；speed 为 None (max) 时每帧用满 fast_budget
+    秒的 CPU 时间尽量多跑物理步。物理步数超出预算或处于 max 模式时，渲染降到
+    每 fast_render_interval 秒一次，事件仍然每帧处理，界面保持可响应。
+    step(max_ticks) 返回实际推进的物理步数，空场时一次可以跳过多步。
+    """
+
+    def __init__(self, dt, fps=60, max_substeps=250, max_frame_dt=0.25, fast_budget=1 / 30, fast_render_interval=0.25):
+        self.dt = dt
+        self.fps = fps
+        self.max_substeps = max_substeps
+        self.max_frame_dt = max_frame_dt  # 单帧最多计入的真实时间，避免窗口卡顿后突然狂跑
+        self.fast_budget = fast_budget
+        self.fast_render_interval = fast_render_interval
+        self.speed = 1
+        self.accumulator = 0.0
+        self.substeps = 0  # 上一帧执行的物理步数
+        self.actual_speed = 1.0  # 实测倍速 (仿真秒 / 真实秒，指数平滑)
+        self._last_render = None
+
+    @property
+    def fps_limit(self):
+        """传给 clock.tick 的帧率上限：max 模式下不限帧 (0)。"""
+        return 0 if self.speed is None else self.fps
+
+    def set_speed(self, speed):
+        self.speed = speed
+        self.accumulator = 0.0
+
+    def advance(self, real_dt, step):
+        """按本帧经过的真实时间 real_dt 调用 step(剩余步数) 若干次，返回本帧是否需要渲染。"""
+        start = time.perf_counter()
+        real_dt = min(real_dt, self.max_frame_dt)
+        n = 0
+        behind = False
+        if self.speed is None:
+            deadline = start + self.fast_budget
+            while time.perf_counter() < deadline:
+                n += step(self.max_substeps)
+        else:
+            self.accumulator += real_dt * self.speed
+            n = min(int(self.accumulator / self.dt + 1e-9), self.max_substeps)
+            done = 0
+            while done < n:
+                done += step(n - done)
+            self.accumulator -= n * self.dt
+            if n == self.max_substeps and self.accumulator >= self.dt:
+                behind = True
+                self.accumulator = 0.0
+
+        self.substeps = n
+        if real_dt > 0:
+            self.actual_speed += 0.1 * (n * self.dt / real_dt - self.actual_speed)
+
+        now = time.perf_counter()
+        slow = behind or self.speed is None or now - start > self.fast_budget
+        if self._last_render is None or not slow or now - self._last_render >= self.fast_render_interval:
+            self._last_render = now
+            return True
+        return False
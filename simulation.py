@@ -1,23 +1,18 @@
 import os
 import sys
-import csv
-from datetime import datetime
-import math
+import time
 import pygame
 import numpy as np
-import random
 import matplotlib.pyplot as plt
 import matplotlib
 import seaborn as sns  # 如果没有 sns 就用 plt.hist
-from vehicle import Vehicle
-
-# --- 增强版常量 ---
-SCREEN_SIZE = 800
-WIDTH = 800  # 这里的数值应与你 pygame.display.set_mode 里的宽度一致
-HEIGHT = 800 # 这里的数值应与高度一致
-CENTER = WIDTH // 2
-R = 120  # 环岛半径
-ROAD_LEN = 250  # 引道长度
+from engine import RoundaboutEngine, SCREEN_SIZE, WIDTH, HEIGHT, CENTER, R
+from render_cache import SpriteCache
+from hud import HudPanel, get_font
+from scheduler import FixedStepScheduler, SPEED_MULTIPLIERS
+from snapshot import save_snapshot, load_snapshot, restore
+
+# --- 界面常量 (场景几何常量统一定义在 engine.py) ---
 FPS = 60
 DT = 1 / FPS
 
@@ -26,366 +21,57 @@ WHITE = (255, 255, 255)
 ROAD_COLOR = (50, 50, 50)
 RED = (200, 50, 50)  # 激进
 BLUE = (50, 50, 200)  # 保守
+HEATMAP_MODES = {None: 'Off', 'total': 'Total', 'recent': 'Recent'}  # H 键依次切换
+
 
+class AdvancedSim(RoundaboutEngine):
+    """pygame 可视化界面：在 RoundaboutEngine 之上负责绘图与键盘交互。"""
 
-class AdvancedSim:
-    def __init__(self):
+    def __init__(self, config=None, sprite_angle_step=2, sprite_cache_size=512, hud_refresh_ms=250,
+                 telemetry_dir='report', batched_idm=False, seed=None):
+        # GUI 会话通常很长，流量/冲突时间序列边跑边写入 report 文件夹
+        super().__init__(config, batched_idm=batched_idm, seed=seed, telemetry_dir=telemetry_dir)
         if not os.path.exists('report'):
             os.makedirs('report')
         pygame.init()
         self.screen = pygame.display.set_mode((SCREEN_SIZE, SCREEN_SIZE))
         self.clock = pygame.time.Clock()
-        self.vehicles = []
-        self.spawn_timer = 0
-        # 入口/出口角度定义: 0:右, pi/2:下, pi:左, 3pi/2:上
-        self.directions = [0, np.pi / 2, np.pi, 3 * np.pi / 2]
-
-        self.vehicles = []
-        self.data_logs = []  # 新增：用于存放已离开车辆的数据
-        self.spawn_timer = 0
-
-        self.total_conflicts = 0  # 全局冲突计数器
-        self.safety_threshold = 2.0  # 定义危险距离（米）：小于2米视为冲突
-
-        self.weight_aggressive = 5  # 激进车初始权重
-        self.weight_conservative = 5  # 保守车初始权重
-
-        self.config = {
-            "car_max_v": 25.0,  # 红车最大速度
-            "truck_max_v": 15.0,  # 蓝车最大速度
-            "safe_gap": 40.0,  # 基础安全跟车距离 (像素)
-            "yield_angle": 1,  # 入场礼让判定弧度 (越大越保守)
-            "spawn_rate": 0.5  # 车辆生成频率
-        }
-
-        # 数据统计容器
-        self.data_logs = []
-        self.stats_travel_times = []  # 存储每张车完成通行的总时间
-        self.stats_conflicts = []  # 存储所有冲突点的坐标 (x, y)
-        self.stats_flow_data = []  # 存储 (当前车数, 瞬时效率/吞吐量)
-        self.stat_timer = 0
-
-    def spawn_vehicle(self):
-        # 1. 总数限制：场上总车数不超 25 (环岛15 + 4路口*2-3辆)
-        if len(self.vehicles) >= 25:
-            return
-
-        # 计算当前的概率分布
-        total_w = self.weight_aggressive + self.weight_conservative
-        if total_w == 0: return  # 防止除以0
 
-        prob_agg = self.weight_aggressive / total_w
-
-        # 抽签决定车型
-        v_type = "aggressive" if random.random() < prob_agg else "conservative"
-
-        # 2. 统计每个路口排队的人数
-        lane_counts = {angle: 0 for angle in self.directions}
-        for v in self.vehicles:
-            if v.state == "APPROACHING":
-                lane_counts[v.start_angle] += 1
-
-        # 3. 找出目前排队最少的路口，且排队不能超过 5 辆
-        available_lanes = [ang for ang, count in lane_counts.items() if count < 8]
-        if not available_lanes:
-            return
-
-        selected_angle = random.choice(available_lanes)
-
-        # 4. 安全间距检查：该路口最后一张车后方是否有位置
-        too_close = any(
-            v.dist_to_center > (ROAD_LEN + R - 50)
-            for v in self.vehicles
-            if v.state == "APPROACHING" and v.start_angle == selected_angle
-        )
-
-        if not too_close:
-            v_type = random.choices(["aggressive", "conservative"], weights=[0.4, 0.6])[0]
-            v = Vehicle(random.randint(1000, 9999), v_type)
-            v.state = "APPROACHING"
-            v.start_angle = selected_angle
-            v.end_angle = random.choice([a for a in self.directions if a != selected_angle])
-            v.dist_to_center = ROAD_LEN + R
-            v.current_angle = v.start_angle
-            v.wait_time = 0
-            v.conflict_count = 0
-            self.vehicles.append(v)
-
-    def get_coords(self, v):
-        CENTER = 400
-        R = 120
-        LANE_OFFSET = 25
-
-        # --- 1. 弧线进入状态：直接返回 update 算好的位置 ---
-        if v.state == "ENTERING":
-            return v.visual_x, v.visual_y
-
-        # --- 2. 环岛状态：没有任何 base + offset，直接用圆周方程 ---
-        if v.state == "CIRCULATING":
-            v.visual_x = CENTER + (R + 25) * np.cos(v.current_angle)
-            v.visual_y = CENTER + (R + 25) * np.sin(v.current_angle)
-            v.angle_to_draw = v.current_angle + np.pi / 2 + np.pi
-            return v.visual_x, v.visual_y
-
-        # --- 3. 引道状态：手动处理偏移，确保不产生跳变 ---
-        if v.state == "APPROACHING":
-            # 基础直线位置
-            base_x = CENTER + v.dist_to_center * np.cos(v.start_angle)
-            base_y = CENTER + v.dist_to_center * np.sin(v.start_angle)
-
-            # 偏移向量（向右 25 像素）
-            target_ox = LANE_OFFSET * np.cos(v.start_angle - np.pi / 2)
-            target_oy = LANE_OFFSET * np.sin(v.start_angle - np.pi / 2)
-
-            # 这里的关键：当距离很近时（< R+100），我们降低平滑权重，让它死死咬住 target
-            v.visual_x = base_x + target_ox
-            v.visual_y = base_y + target_oy
-            v.angle_to_draw = v.start_angle + np.pi
-            return v.visual_x, v.visual_y
-
-        return v.visual_x, v.visual_y
-
-
-    def get_avg_speed(self):
-        """计算当前场上所有车辆的平均速度"""
-        if not self.vehicles:
-            return 0.0
-        total_speed = sum(v.v for v in self.vehicles)
-        return total_speed / len(self.vehicles)
-
-    def update(self):
-        R = 120
-        DT = 0.02
-        CENTER_X, CENTER_Y = 400, 400
-        LANE_OFFSET = 25
-        STOP_LINE_DISTANCE = 175
-
-        # 计算环岛内的活跃车辆数
-        in_ring_count = len([veh for veh in self.vehicles if veh.state in ["ENTERING", "CIRCULATING", "EXITING"]])
-
-        for v in self.vehicles[:]:
-            # 1. 基础物理更新
-            lead_v = self.get_lead_vehicle(v)
-            v.a = v.update_acceleration(lead_v)
-
-            # 强行起步补丁
-            if v.v < 0.2:
-                if not lead_v or (v.state == "APPROACHING" and v.dist_to_center - lead_v.dist_to_center > 55):
-                    if v.state != "APPROACHING" or not self.check_ring_conflict(v):
-                        v.a = max(v.a, 0.8)
-                self.wait_time += 0.016
-
-            v.v += v.a * DT
-            v.v = max(0, v.v)
-
-            # 2. 状态机
-            if v.state == "APPROACHING":
-                # 入场门槛：环岛内小于 15 辆 且 门口没车
-                can_enter_ring = (in_ring_count < 15) and (not self.check_ring_conflict(v))
-
-                # 判定前车：如果前车在停止线没走，我也不能动
-                if lead_v and (v.dist_to_center - lead_v.dist_to_center < 50):
-                    can_enter_ring = False
-
-                if v.dist_to_center <= STOP_LINE_DISTANCE:
-                    if can_enter_ring:
-                        v.state = "ENTERING"
-                        v.entry_path = self.generate_entry_path(v, R)
-                        v.path_index = 0
-                        v.v = max(v.v, 2.5)  # 瞬时速度，防止卡死
-                        in_ring_count += 1  # 实时更新计数
-                        continue
-                    else:
-                        v.v = 0
-                        v.dist_to_center = STOP_LINE_DISTANCE
-                else:
-                    v.dist_to_center -= v.v * DT
-
-                # 同步位置
-                self.get_coords(v)
-
-            elif v.state == "ENTERING":
-                v.v = min(max(v.v, 2.0), 6.0)  # 转弯保底 2.0
-                v.path_index += 0.8
-                idx = int(v.path_index)
-                if idx < len(v.entry_path) - 1:
-                    v.visual_x, v.visual_y = v.entry_path[idx]
-                    p_next = v.entry_path[idx + 1]
-                    v.angle_to_draw = math.atan2(p_next[1] - v.visual_y, p_next[0] - v.visual_x)
-                    dx, dy = v.visual_x - CENTER_X, v.visual_y - CENTER_Y
-                    v.current_angle = math.atan2(dy, dx)
-                else:
-                    v.state = "CIRCULATING"
-
-            elif v.state == "CIRCULATING":
-                v.v = max(v.v, 3.0)
-                v.v = min(v.v, 12.0)
-                v.current_angle -= (v.v / (R + LANE_OFFSET)) * DT
-                v.current_angle %= (2 * np.pi)
-                self.get_coords(v)
-                v.angle_to_draw = v.current_angle - math.pi / 2
-
-                # 检查是否到出口
-                angle_to_exit = (v.current_angle - v.end_angle) % (2 * np.pi)
-                if angle_to_exit < 0.25:
-                    v.state = "EXITING"
-                    v.exit_path = self.generate_exit_path(v, R)
-                    v.path_index = 0
-
-            elif v.state == "EXITING":
-                v.v = max(v.v, 2.5)  # 强行排空，出口车就是大爷
-                v.path_index += 0.8
-                idx = int(v.path_index)
-                if idx < len(v.exit_path) - 1:
-                    v.visual_x, v.visual_y = v.exit_path[idx]
-                    p_next = v.exit_path[idx + 1]
-                    v.angle_to_draw = math.atan2(p_next[1] - v.visual_y, p_next[0] - v.visual_x)
-                    dx, dy = v.visual_x - CENTER_X, v.visual_y - CENTER_Y
-                    v.dist_to_center = math.sqrt(dx ** 2 + dy ** 2)
-                else:
-                    v.state = "STRAIGHT_OUT"
-
-            elif v.state == "STRAIGHT_OUT":
-                v.dist_to_center += v.v * DT
-                exit_angle = v.end_angle
-                # 重新计算坐标防止漂移
-                v.visual_x = CENTER_X + v.dist_to_center * math.cos(exit_angle) - LANE_OFFSET * math.sin(exit_angle)
-                v.visual_y = CENTER_Y + v.dist_to_center * math.sin(exit_angle) + LANE_OFFSET * math.cos(exit_angle)
-                v.angle_to_draw = exit_angle
-
-                if v.dist_to_center > 1000:
-                    self.stats_travel_times.append(v.wait_time + v.enter_time)  # 或者是你定义的统计字段
-                    if v in self.vehicles: self.vehicles.remove(v)
-
-                duration = (pygame.time.get_ticks() - v.spawn_time) / 1000.0  # 转换为秒
-                self.stats_travel_times.append(duration)
-
-                # --- 2. 写入档案库 (关键：修复数据为空的问题) ---
-                self.data_logs.append({
-                    'id': v.id,
-                    'type': v.type,
-                    'travel_time': round(duration, 2),
-                    'wait_time': round(v.wait_time, 2),
-                    'conflicts': v.conflict_count,
-                    'status': 'completed'
-                })
-
-        # 统计效率
-        active_ring_vehicles = [v for v in self.vehicles if v.state == "CIRCULATING"]
-        flow_count = len(active_ring_vehicles)
-        if flow_count > 0:
-            avg_speed = sum([v.v for v in active_ring_vehicles]) / flow_count
-            self.stats_flow_data.append((flow_count, avg_speed))
-
-
-    def generate_entry_path(self, v, R):
-        CENTER = 400
-        LANE_OFFSET = 25
-        TARGET_R = R + LANE_OFFSET  # 目标永远是外圈 (145)
-
-        # 1. 起点 P0: 严格锁定在当前车道的右侧边缘
-        # 不要信任当前的 visual_x，手动根据 start_angle 计算它应该在的位置
-        p0 = np.array([
-            CENTER + (R + 40) * np.cos(v.start_angle) + LANE_OFFSET * np.cos(v.start_angle - np.pi / 2),
-            CENTER + (R + 40) * np.sin(v.start_angle) + LANE_OFFSET * np.sin(v.start_angle - np.pi / 2)
-        ])
-
-        # 2. 终点 P2: 关键点！我们要把进入点往“下游”挪动
-        # 减去约 20 度 (0.35 弧度)，让车子斜着切入，而不是对着圆心冲
-        entry_angle = v.start_angle - 0.35
-        p2 = np.array([
-            CENTER + TARGET_R * np.cos(entry_angle),
-            CENTER + TARGET_R * np.sin(entry_angle)
-        ])
-
-        # 3. 控制点 P1: 位于 P0 的正前方，确保车子先直行一小段
-        fwd_direction = np.array([-np.cos(v.start_angle), -np.sin(v.start_angle)])
-        p1 = p0 + fwd_direction * 25
-
-        # 生成路径
-        path = []
-        for t in np.linspace(0, 1, 100):  # 增加点数让曲线更平滑
-            pt = (1 - t) ** 2 * p0 + 2 * (1 - t) * t * p1 + t ** 2 * p2
-            path.append(pt)
-
-        # 强制同步：把车子的物理角度也对准 entry_angle
-        # 这样当它结束弧线进入环岛时，位置和角度是完美的
-        v.current_angle = entry_angle
-        v.visual_x, v.visual_y = p0[0], p0[1]
-
-        return path
-
-    def generate_exit_path(self, v, R):
-        LANE_OFFSET = 25
-        # P0: 车辆当前在圆周上的视觉位置
-        p0 = np.array([v.visual_x, v.visual_y])
-
-        # 这里的 v.current_angle 是车辆在圆周上的角度位置
-        # 在逆时针环岛中，切线方向是 v.current_angle - pi/2
-        tangent_angle = v.current_angle - np.pi / 2
-
-        # P1: 控制点。我们让它沿着切线方向延伸一段距离
-        # 距离（50-70）决定了转向的平缓程度，越大越平缓
-        p1_dist = 20
-        p1 = p0 + np.array([p1_dist * math.cos(tangent_angle),
-                            p1_dist * math.sin(tangent_angle)])
-
-        # P2: 最终驶入直线车道的靠右点 (R + 100 处)
-        exit_angle = v.end_angle
-        target_r = R + 100
-        p2 = np.array([
-            400 + target_r * math.cos(exit_angle) - LANE_OFFSET * math.sin(exit_angle),
-            400 + target_r * math.sin(exit_angle) + LANE_OFFSET * math.cos(exit_angle)
-        ])
-
-        # 生成贝塞尔曲线点
-        path = []
-        for t in np.linspace(0, 1, 100):
-            pt = (1 - t) ** 2 * p0 + 2 * (1 - t) * t * p1 + t ** 2 * p2
-            path.append(pt)
-        return path
-
-    def check_ring_conflict(self, v):
-        for other in self.vehicles:
-            if other.state in ["CIRCULATING", "ENTERING", "EXITING"]:
-                # 计算环岛车相对于我入场点的角度差
-                d_angle = (v.start_angle - other.current_angle) % (2 * math.pi)
-                # 0.3 弧度大约是 20 度，只要它不在我正前方这 20 度内，我就敢进！
-                if d_angle < 0.5 or d_angle > (2 * math.pi - 0.2):
-                    self.stats_conflicts.append((v.visual_x, v.visual_y))
-                    return True
-        return False
-
-    def get_lead_vehicle(self, v):
-        lead_v = None
-        min_dist = float('inf')
-
-        for other in self.vehicles:
-            if v == other: continue
-
-            if v.state in ["ENTERING", "CIRCULATING", "EXITING"]:
-                if other.state not in ["ENTERING", "CIRCULATING", "EXITING"]:
-                    continue
-
-                # 逆时针环岛：前车的角度比我小
-                # 计算 (我的角度 - 他的角度) % 2pi 得到的是我到他的顺时针距离
-                # 在逆时针坐标系下，这正是我们要的前向弧长角度
-                d_angle = (v.current_angle - other.current_angle) % (2 * math.pi)
-
-                # 只关注前方 0.8 弧度（约 45 度）内的车，防止误判身后的车
-                if 0 < d_angle < 0.8:
-                    dist = d_angle * 145.0  # 使用车道半径
-                    if dist < min_dist:
-                        min_dist, lead_v = dist, other
-
-            elif v.state == "APPROACHING":
-                if other.state == "APPROACHING" and v.start_angle == other.start_angle:
-                    dist = v.dist_to_center - other.dist_to_center
-                    if 0 < dist < min_dist:
-                        min_dist, lead_v = dist, other
-        return lead_v
-
-    def _draw_roundabout(self):
+        # 渲染缓存：旋转后的车辆贴图按量化角度复用，静态路网只画一次
+        self.sprites = SpriteCache(sprite_angle_step, sprite_cache_size)
+        self._background = None
+
+        # HUD：字体与背景板只创建一次，平均速度这类快变指标按 hud_refresh_ms 限频刷新
+        self.hud_refresh_ms = hud_refresh_ms
+        self.dashboard_panel = HudPanel((10, 10), (300, 295), (40, 40, 40))
+        self.controls_panel = HudPanel((SCREEN_SIZE - 320 - 10, 10), (320, 165), (0, 0, 0),
+                                       border=(200, 200, 200))
+        # 在线统计面板：已离场车辆的通行时间/等待/冲突，按车型与路口实时汇总
+        self.stats_panel = HudPanel((SCREEN_SIZE - 320 - 10, 185), (320, 135), (40, 40, 40))
+
+        # 固定步长推进：F1~F4 切换 1x/10x/100x/max，倍速越高越少渲染
+        self.scheduler = FixedStepScheduler(self.dt, FPS)
+        self.speed_keys = dict(zip([pygame.K_F1, pygame.K_F2, pygame.K_F3, pygame.K_F4], SPEED_MULTIPLIERS))
+
+        # P 键开关分阶段耗时统计：主循环各阶段按执行顺序排列，display.flip 在 run() 中手动计时
+        self.profiler.phases = dict({'handle_events': 'handle_events'}, **self.profiler.phases,
+                                    draw='draw', draw_heatmap='heatmap', draw_dashboard='dashboard',
+                                    draw_controls='controls', draw_stats='stats')
+        self.profile_panel = HudPanel((10, 315), (330, 260), (0, 0, 0))
+        self._profile_refreshed = 0
+
+        # H 键切换冲突热力图叠加层：关闭 -> 累计 -> 近期 (按半衰期衰减)；网格图层按 hud_refresh_ms 限频重建
+        self.heatmap_mode = None
+        self._heatmap_layer = None
+        self._heatmap_refreshed = 0
+
+    def _build_background(self):
+        background = pygame.Surface(self.screen.get_size()).convert()
+        background.fill((220, 220, 220))  # 浅背景色
+        self._draw_roundabout(background)  # 绘制路面
+        return background
+
+    def _draw_roundabout(self, surface):
         # --- 1. 基础参数定义 ---
         ROAD_GRAY = (50, 50, 50)
         GRASS_GREEN = (10, 80, 10)
@@ -394,106 +80,158 @@ class AdvancedSim:
 
         total_road_width = 100
         outer_radius = R + (total_road_width // 2)  # 环岛路面外边缘 (R+50)
-        inner_radius = R - (total_road_width // 8)  # 绿化带边缘 (R-50)
+        inner_radius = R - (total_road_width // 8)  # 绿化带边缘 (R-12)
+        # 多车道时绿化带让出最内侧车道
+        inner_radius = min(inner_radius, int(self.lane_radii[-1] - 13))
 
         # --- 2. 绘制引道路面 (最底层) ---
         road_half_w = 40
         # 横向引道
-        pygame.draw.rect(self.screen, ROAD_GRAY, (0, CENTER - road_half_w, WIDTH, road_half_w * 2))
+        pygame.draw.rect(surface, ROAD_GRAY, (0, CENTER - road_half_w, WIDTH, road_half_w * 2))
         # 纵向引道
-        pygame.draw.rect(self.screen, ROAD_GRAY, (CENTER - road_half_w, 0, road_half_w * 2, HEIGHT))
+        pygame.draw.rect(surface, ROAD_GRAY, (CENTER - road_half_w, 0, road_half_w * 2, HEIGHT))
 
         # --- 3. 绘制环岛主体 (覆盖十字路口中心) ---
         # 环岛灰色路面
-        pygame.draw.circle(self.screen, ROAD_GRAY, (CENTER, CENTER), outer_radius)
+        pygame.draw.circle(surface, ROAD_GRAY, (CENTER, CENTER), outer_radius)
         # 中心岛绿化带
-        pygame.draw.circle(self.screen, GRASS_GREEN, (CENTER, CENTER), inner_radius)
-        # 环岛中间白色分界线 (R)
-        pygame.draw.circle(self.screen, LINE_WHITE, (CENTER, CENTER), R, 2)
+        pygame.draw.circle(surface, GRASS_GREEN, (CENTER, CENTER), inner_radius)
+        # 环岛中间白色分界线 (R)；多车道时改画相邻环道之间的分道线
+        if len(self.lane_radii) == 1:
+            pygame.draw.circle(surface, LINE_WHITE, (CENTER, CENTER), R, 2)
+        for outer, inner in zip(self.lane_radii, self.lane_radii[1:]):
+            pygame.draw.circle(surface, LINE_WHITE, (CENTER, CENTER), int((outer + inner) / 2), 2)
 
         # --- 4. 绘制引道黄线 (截断逻辑) ---
         # 黄线只画到环岛外边缘 (outer_radius) 为止，防止贯穿环岛
 
         # 水平左侧黄线
-        pygame.draw.line(self.screen, CENTER_YELLOW, (0, CENTER), (CENTER - outer_radius, CENTER), 2)
+        pygame.draw.line(surface, CENTER_YELLOW, (0, CENTER), (CENTER - outer_radius, CENTER), 2)
         # 水平右侧黄线
-        pygame.draw.line(self.screen, CENTER_YELLOW, (CENTER + outer_radius, CENTER), (WIDTH, CENTER), 2)
+        pygame.draw.line(surface, CENTER_YELLOW, (CENTER + outer_radius, CENTER), (WIDTH, CENTER), 2)
         # 垂直上方黄线
-        pygame.draw.line(self.screen, CENTER_YELLOW, (CENTER, 0), (CENTER, CENTER - outer_radius), 2)
+        pygame.draw.line(surface, CENTER_YELLOW, (CENTER, 0), (CENTER, CENTER - outer_radius), 2)
         # 垂直下方黄线
-        pygame.draw.line(self.screen, CENTER_YELLOW, (CENTER, CENTER + outer_radius), (CENTER, HEIGHT), 2)
+        pygame.draw.line(surface, CENTER_YELLOW, (CENTER, CENTER + outer_radius), (CENTER, HEIGHT), 2)
 
     def draw(self):
-        self.screen.fill((220, 220, 220))  # 浅背景色
-        self._draw_roundabout()  # 绘制路面
-
-        for v in self.vehicles:
-            x, y = self.get_coords(v)
-            # 显示车辆速度
-            # font = pygame.font.SysFont("Arial", 12)
-            # txt = font.render(f"{v.state} v:{v.v:.1f}", True, (255, 255, 255))
-            # self.screen.blit(txt, (v.visual_x, v.visual_y - 20))
-            # --- 核心：计算车辆朝向 (Heading) ---
-            # 进场和出场朝向是固定的角度，环岛内朝向是切线方向
-            if v.state == "APPROACHING":
-                angle = v.start_angle + np.pi  # 朝向中心
-            elif v.state == "CIRCULATING":
-                # 切线方向 = 当前角度 + 90度 (逆时针)
-                angle = getattr(v, 'current_angle', v.start_angle) + np.pi / 2
-            else:  # EXITING
-                angle = v.end_angle  # 背离中心
-
-            # --- 绘制长方形车身 ---
-            car_length = 24
-            car_width = 14
-
-            # 创建一个可以旋转的 Surface
-            car_surface = pygame.Surface((car_length, car_width), pygame.SRCALPHA)
-            color = (200, 30, 30) if v.type == "aggressive" else (30, 80, 200)  # 深红/深蓝
-
-            # 画车身矩形
-            pygame.draw.rect(car_surface, color, (0, 0, car_length, car_width), border_radius=3)
-            # 画一个深色矩形代表前挡风玻璃（区分车头车尾）
-            pygame.draw.rect(car_surface, (50, 50, 50), (car_length - 8, 2, 6, car_width - 4))
-
-            # 旋转 Surface (pygame 逆时针旋转角度为度数)
-            angle_deg = np.degrees(-v.angle_to_draw)
-            rotated_car = pygame.transform.rotate(car_surface, angle_deg)
+        self.draw_vehicles([(*self.get_coords(v), v.angle_to_draw, v.type) for v in self.vehicles])
+
+    def draw_vehicles(self, poses):
+        """画背景与车辆；poses 为 [(x, y, 朝向弧度, 车型), ...]，实时仿真与轨迹回放共用。"""
+        if self._background is None:
+            self._background = self._build_background()
+        self.screen.blit(self._background, (0, 0))
+
+        blits = []
+        for x, y, heading, v_type in poses:
+            # 旋转后的贴图按车型和量化角度取自缓存 (pygame 逆时针旋转角度为度数)
+            rotated_car = self.sprites.get(v_type, np.degrees(-heading))
             rect = rotated_car.get_rect(center=(int(x), int(y)))
+            blits.append((rotated_car, rect))
 
-            self.screen.blit(rotated_car, rect)
+        self.screen.blits(blits, False)
 
     def draw_dashboard(self, screen):
-        # 1. 绘制背景板
-        overlay = pygame.Surface((300, 220))
-        overlay.set_alpha(180)
-        overlay.fill((40, 40, 40))
-        screen.blit(overlay, (10, 10))
-
-        # 2. 显示实时指标
-        font = pygame.font.SysFont("Arial", 18)
+        # 1. 背景板与字体都已缓存
+        panel = self.dashboard_panel
+        font = get_font("Arial", 18)
+
+        # 2. 显示实时指标 (文字没变就不重新渲染)
         stats = [
             f"Total Conflicts: {self.total_conflicts}",
             f"Active Vehicles: {len(self.vehicles)}",
-            f"Avg Speed: {self.get_avg_speed():.1f}",
+            lambda: f"Avg Speed: {self.get_avg_speed():.1f}",
+            lambda: f"Sim Time: {self.sim_time:.0f} s  x{self.scheduler.actual_speed:.1f}",
             "-----------------------",
             f"[1/2] Car Max V: {self.config['car_max_v']}",
             f"[3/4] Safe Gap: {self.config['safe_gap']}",
             f"[5/6] Yield Angle: {self.config['yield_angle']:.1f}",
-            "Press keys to adjust values"
+            "[F1-F4] Speed 1x/10x/100x/max  [F5] Snap",
+            f"[R] {'Recording...' if self.recorder is not None else 'Record'}  [P] Profiler",
+            f"[H] Heatmap: {HEATMAP_MODES[self.heatmap_mode]}",
         ]
 
         for i, text in enumerate(stats):
-            color = (255, 255, 255) if i < 4 else (0, 255, 127)
-            txt_surface = font.render(text, True, color)
-            screen.blit(txt_surface, (20, 20 + i * 25))
+            color = (255, 255, 255) if i < 5 else (0, 255, 127)
+            refresh_ms = self.hud_refresh_ms if callable(text) else 0
+            panel.set_text(i, text, font, color, (10, 10 + i * 25), refresh_ms)
+        panel.draw(screen)
+
+    def draw_heatmap(self):
+        """把冲突热力图网格画成半透明图层 (颜色与透明度随冲突密度增加)。"""
+        now = pygame.time.get_ticks()
+        if self._heatmap_layer is None or now - self._heatmap_refreshed >= self.hud_refresh_ms:
+            self._heatmap_refreshed = now
+            grid = self.heatmap.grid(self.sim_time if self.heatmap_mode == 'recent' else None)
+            peak = grid.max()
+            level = (grid / peak if peak > 0 else np.zeros_like(grid, dtype=np.float64)).T  # surfarray 按 [x, y] 索引
+            layer = pygame.Surface(level.shape, pygame.SRCALPHA)
+            rgb = pygame.surfarray.pixels3d(layer)
+            rgb[..., 0] = 255
+            rgb[..., 1] = (230 * (1 - level)).astype(np.uint8)
+            rgb[..., 2] = 0
+            del rgb
+            alpha = pygame.surfarray.pixels_alpha(layer)
+            alpha[...] = (200 * np.sqrt(level)).astype(np.uint8)
+            del alpha
+            self._heatmap_layer = pygame.transform.smoothscale(layer, self.screen.get_size())
+        self.screen.blit(self._heatmap_layer, (0, 0))
+
+    def draw_stats(self):
+        panel = self.stats_panel
+        font = get_font("Arial", 15)
+        stats = self.stats
+
+        def type_line(v_type):
+            n, mean, std, p50, p90 = stats.summary(f'type:{v_type}', 'travel_time')
+            return f"{v_type[:4]}: TT {mean:.1f}±{std:.1f}s  p50 {p50:.0f}  p90 {p90:.0f}  (n={n})"
+
+        def wait_line():
+            parts = []
+            for v_type in ('aggressive', 'conservative'):
+                wait = stats.summary(f'type:{v_type}', 'wait_time')[1]
+                conflicts = stats.summary(f'type:{v_type}', 'conflicts')[1]
+                parts.append(f"{v_type[:4]} {wait:.1f}s/{conflicts:.2f}")
+            return "Wait/Conflicts per veh: " + "  ".join(parts)
+
+        def arm_line():
+            names = ['E', 'S', 'W', 'N']  # 路口序号与 self.directions 一致：右、下、左、上
+            return "Arm TT: " + "  ".join(f"{names[i]} {stats.summary(f'arm:{i}', 'travel_time')[1]:.0f}"
+                                          for i in range(len(self.directions)))
+
+        lines = [
+            lambda: (f"Completed {stats.group('all').counts['completed']}"
+                     f" / Spawned {stats.group('all').counts['spawned']}"
+                     f" / Dropped {sum(self.arrivals.dropped)}"),
+            lambda: type_line('aggressive'),
+            lambda: type_line('conservative'),
+            wait_line,
+            arm_line,
+        ]
+        for i, text in enumerate(lines):
+            panel.set_text(i, text, font, (255, 255, 255), (10, 8 + i * 25), self.hud_refresh_ms)
+        panel.draw(self.screen)
+
+    def draw_profile(self):
+        """性能面板：各阶段最近若干帧耗时的 p50/p95/max (毫秒)，每 500ms 刷新一次。"""
+        now = pygame.time.get_ticks()
+        if now - self._profile_refreshed >= 500:
+            self._profile_refreshed = now
+            font = get_font("Arial", 14)
+            rows = [("phase (ms)", "p50", "p95", "max")] + [
+                (label, f"{p50:.2f}", f"{p95:.2f}", f"{peak:.2f}") for label, p50, p95, peak in self.profiler.rows()]
+            for i, row in enumerate(rows):
+                color = (255, 255, 0) if i == 0 else (255, 255, 255)
+                for j, (text, x) in enumerate(zip(row, (10, 170, 225, 280))):
+                    self.profile_panel.set_text((i, j), text, font, color, (x, 8 + i * 20))
+        self.profile_panel.draw(self.screen)
 
     def draw_controls(self):
-        # 1. 设置面板的基础坐标和大小
-        panel_width = 320
-        panel_height = 165
-        start_x = SCREEN_SIZE - panel_width - 10
-        start_y = 10
+        # 1. 面板的基础坐标和大小
+        panel = self.controls_panel
+        start_x, start_y = panel.pos
+        panel_width = panel.size[0]
 
         # 2. 获取数据（确保 self.weight_aggressive 这些变量已经存在）
         w_agg = self.weight_aggressive
@@ -501,44 +239,18 @@ class AdvancedSim:
         total_w = w_agg + w_con
         ratio_percent = (w_agg / total_w * 100) if total_w > 0 else 0
 
-        # 3. 准备字体 (在这里统一定义，解决“不认识”的问题)
-        try:
-            # 优先使用中文字体，没有就用系统默认
-            main_font = pygame.font.SysFont("SimHei", 20)
-            hint_font = pygame.font.SysFont("SimHei", 16)  # 这就是你要的 small font
-        except:
-            main_font = pygame.font.SysFont("arial", 18)
-            hint_font = pygame.font.SysFont("arial", 14)
-
-        # 4. 绘制半透明背景面板
-        overlay = pygame.Surface((panel_width, panel_height))
-        overlay.set_alpha(180)
-        overlay.fill((0, 0, 0))
-        self.screen.blit(overlay, (start_x, start_y))
-
-        # 5. 画边框
-        pygame.draw.rect(self.screen, (200, 200, 200), (start_x, start_y, panel_width, panel_height), 2)
-
-        # 6. 渲染并绘制文字
-        # 激进权重
-        txt_agg = main_font.render(f"激进权重 (UP+/DOWN-): {w_agg}", True, (255, 50, 50))
-        self.screen.blit(txt_agg, (start_x + 20, start_y + 15))
-
-        # 保守权重
-        txt_con = main_font.render(f"保守权重 (RIGHT+/LEFT-): {w_con}", True, (80, 80, 255))
-        self.screen.blit(txt_con, (start_x + 20, start_y + 45))
-
-        # 比例显示
-        txt_ratio = main_font.render(f"生成倾向: {ratio_percent:.1f}% 激进", True, (255, 255, 255))
-        self.screen.blit(txt_ratio, (start_x + 20, start_y + 75))
-
-        # 底部提示文字 (使用刚才定义的 hint_font)
-        # txt_hint = hint_font.render("按 [空格键] 生成统计分析图表", True, (200, 200, 200))
-        # self.screen.blit(txt_hint, (start_x + 20, start_y + 135))
-        self.screen.blit(hint_font.render("按 [数字 8] 汇统计图，导出 CSV 数据", True, (0, 255, 255)),
-                         (start_x + 20, start_y + 135))
-
-        # 7. 绘制彩色进度条
+        # 3. 字体：优先使用中文字体，SysFont 找不到时会自动退回系统默认字体
+        main_font = get_font("SimHei", 20)
+        hint_font = get_font("SimHei", 16)
+
+        # 4. 文字 (只在数值变化时重新渲染)，背景面板与边框由 HudPanel 绘制
+        panel.set_text("agg", f"激进权重 (UP+/DOWN-): {w_agg}", main_font, (255, 50, 50), (20, 15))
+        panel.set_text("con", f"保守权重 (RIGHT+/LEFT-): {w_con}", main_font, (80, 80, 255), (20, 45))
+        panel.set_text("ratio", f"生成倾向: {ratio_percent:.1f}% 激进", main_font, (255, 255, 255), (20, 75))
+        panel.set_text("hint", "[8] 统计图+CSV  [9] 按列导出档案", hint_font, (0, 255, 255), (20, 135))
+        panel.draw(self.screen)
+
+        # 5. 绘制彩色进度条
         bar_x, bar_y = start_x + 20, start_y + 110
         bar_w, bar_h = panel_width - 40, 15
 
@@ -565,12 +277,11 @@ class AdvancedSim:
         axes[0].set_xlabel("Time (s)")
         axes[0].set_ylabel("Vehicle Count")
 
-        # 2. 冲突热力图 (Heatmap/Scatter)
-        if self.stats_conflicts:
-            cx, cy = zip(*self.stats_conflicts)
-            hb = axes[1].hexbin(cx, cy, gridsize=30, cmap='YlOrRd', extent=[0, 800, 0, 800])
+        # 2. 冲突热力图：直接画在线累计的网格，耗时只与网格大小有关
+        if self.heatmap.total:
+            axes[1].imshow(np.ma.masked_equal(self.heatmap.counts, 0), cmap='YlOrRd',
+                           extent=self.heatmap.extent, interpolation='nearest')  # extent 的 y 轴向下，与 Pygame 一致
             axes[1].set_title("Conflict Heatmap (Real Position)")
-            axes[1].invert_yaxis()  # 匹配 Pygame 的 Y 轴向下增长
             # 画一个环岛轮廓方便对比
             circle = plt.Circle((400, 400), 120, color='blue', fill=False, linestyle='--')
             axes[1].add_artist(circle)
@@ -591,66 +302,12 @@ class AdvancedSim:
         # plt.close()  # 记得关闭，防止内存占用
         print(f"✅ 统计图表已保存至: {output_path}")
 
-    def export_data(self):
-        """将所有统计数据导出为 CSV"""
-        # 1. 整合已离开和还在场上的车辆
-        final_list = list(self.data_logs)
-
-        for v in self.vehicles:
-            final_list.append({
-                'id': v.id,
-                'type': v.type,
-                'travel_time': round((pygame.time.get_ticks() - v.spawn_time) / 1000.0, 2),
-                'wait_time': round(v.wait_time, 2),
-                'conflicts': v.conflict_count,
-                'status': 'still_in_simulation'
-            })
-
-        if not final_list:
-            print("没有记录到任何车辆数据，无法导出！")
-            return
-
-        filename = os.path.join('report', f"traffic_analysis_{pygame.time.get_ticks()}.csv")
-
-        # 2. 这里的 keys 必须手动指定或确保 final_list 肯定有数据
-        keys = ['id', 'type', 'travel_time', 'wait_time', 'conflicts', 'status']
-
-        try:
-            with open(filename, 'w', newline='', encoding='utf-8') as f:
-                dict_writer = csv.DictWriter(f, fieldnames=keys)
-                dict_writer.writeheader()
-                dict_writer.writerows(final_list)
-            print(f"数据已完整导出！共 {len(final_list)} 条记录。文件名: {filename}")
-        except PermissionError:
-            print("错误：文件被占用，请先关闭正在查看该 CSV 的 Excel 窗口！")
-
-    def save_to_csv(self):
-
-        # 创建一个带时间戳的文件名，防止覆盖之前的实验
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-
-        # 1. 保存流量-效率数据
-        flow_filename = os.path.join('report', f'flow_data_{timestamp}.csv')
-        with open(flow_filename, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(['Number_of_Vehicles', 'Avg_Speed_Efficiency'])
-            writer.writerows(self.stats_flow_data)
-
-        # 2. 保存通行时间数据
-        travel_filename = os.path.join('report', f'travel_time_{timestamp}.csv')
-        with open(travel_filename, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(['Travel_Time_Seconds'])
-            for t in self.stats_travel_times:
-                writer.writerow([t])
-
-        print(f"数据已导出到 CSV 文件！时间戳: {timestamp}")
-
     def handle_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 print("正在自动保存数据...")
                 self.export_data()
+                self.close()
                 pygame.quit()  # 卸载 pygame 模块
                 sys.exit()  # 强制终止 Python 进程，防止窗口卡死
                 self.running = False  # 确保类里有 self.running 属性
@@ -663,6 +320,29 @@ class AdvancedSim:
                     self.export_data()  # 存详细档案
                     self.save_to_csv()  # 存绘图原始数据
                     self.plot_results()  # 存仿真图表
+                # 9 键：按列导出二进制档案 (大规模实验时分析脚本读取更快)
+                if event.key == pygame.K_9:
+                    self.export_data(fmt='columnar')
+                # F1~F4：仿真倍速
+                if event.key in self.speed_keys:
+                    self.scheduler.set_speed(self.speed_keys[event.key])
+                # P 键：开关分阶段性能统计
+                if event.key == pygame.K_p:
+                    self.profiler.toggle()
+                # F5：保存完整仿真状态快照 (python simulation.py <快照> 从快照继续，sweep.py --snapshot 从快照分叉)
+                if event.key == pygame.K_F5:
+                    print(f">>> 快照已保存: {save_snapshot(self)}")
+                # H 键：切换冲突热力图叠加层
+                if event.key == pygame.K_h:
+                    modes = list(HEATMAP_MODES)
+                    self.heatmap_mode = modes[(modes.index(self.heatmap_mode) + 1) % len(modes)]
+                    self._heatmap_layer = None
+                # R 键：开始/停止轨迹录制 (用 python replay.py 回放)
+                if event.key == pygame.K_r:
+                    if self.recorder is None:
+                        print(f">>> 开始录制轨迹: {self.start_recording()}")
+                    else:
+                        self.stop_recording()
                 # 按 Q/A 调激进车比例
                 if event.key == pygame.K_UP: self.weight_aggressive += 1
                 if event.key == pygame.K_DOWN: self.weight_aggressive = max(0, self.weight_aggressive - 1)
@@ -699,22 +379,27 @@ class AdvancedSim:
         running = True
         try:
             while running:
+                # 0. 上一轮循环计为一帧 (性能统计关闭时跳过)
+                if self.profiler.enabled:
+                    self.profiler.end_frame()
+
                 # 1. 专门处理所有输入事件
                 self.handle_events()
 
-                # 2. 车辆生成逻辑
-                self.spawn_timer += 1
-                if self.spawn_timer > 15:
-                    self.spawn_vehicle()
-                    self.spawn_timer = 0
-
-                # 3. 物理逻辑更新
-                self.update()
+                # 2. 车辆生成 + 物理逻辑更新：按真实经过时间和倍速执行若干固定物理步
+                real_dt = self.clock.tick(self.scheduler.fps_limit) / 1000.0
+                if not self.scheduler.advance(real_dt, self.step):
+                    continue  # 高倍速下跳过本帧渲染
 
                 # 4. 绘图渲染
                 self.draw()  # 画背景、道路和车辆
+                if self.heatmap_mode is not None:
+                    self.draw_heatmap()
                 self.draw_dashboard(self.screen)  # 在最上层画仪表盘
                 self.draw_controls()
+                self.draw_stats()
+                if self.profiler.enabled:
+                    self.draw_profile()
                 # --- 调试绘图开始 ---
                 # 必须遍历 self.vehicles 才能拿到每一辆车 v
                 # for v in self.vehicles:
@@ -732,13 +417,19 @@ class AdvancedSim:
                 # pygame.draw.circle(self.screen, (0, 255, 0), (400, 400), 120 + 25, 1)
                 # --- 调试绘图结束 ---
                 # 5. 刷新屏幕
-                pygame.display.flip()
-                self.clock.tick(60)
+                if self.profiler.enabled:
+                    start = time.perf_counter()
+                    pygame.display.flip()
+                    self.profiler.add('flip', time.perf_counter() - start)
+                else:
+                    pygame.display.flip()
         except:
             pass
         finally:
+            self.close()
             pygame.quit()
 
 if __name__ == "__main__":
-    sim = AdvancedSim()
+    # 可选参数：F5 保存的快照文件，从该时刻继续运行
+    sim = restore(load_snapshot(sys.argv[1]), AdvancedSim) if len(sys.argv) > 1 else AdvancedSim()
     sim.run()
\ No newline at end of file
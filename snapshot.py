@@ -0,0 +1,160 @@
+import os
+import zlib
+import pickle
+from datetime import datetime
+from vehicle import APPROACHING, ENTERING, EXITING
+
+SNAPSHOT_VERSION = 2  # 2: 车辆状态改为整数编码 (版本 1 的快照加载时转换)
+READABLE_VERSIONS = (1, 2)
+# 构造时就决定了几何或到达日历的参数，从快照分叉时不能修改
+FROZEN_KEYS = ('ring_lanes', 'demand_profile', 'demand_period', 'headway_model', 'empirical_headways', 'od_matrix')
+ARRIVAL_FIELDS = ('calendar', '_seq', 'scheduled', 'dropped', 'retries')
+TELEMETRY_FIELDS = ('_bucket', '_ticks', '_count_sum', '_speed_sum', '_bucket_conflicts')
+
+
+def capture(sim):
+    """把仿真的完整状态整理成只含普通对象的字典。
+
+    包括车辆 (状态机字段与路径进度)、时钟、两条随机数流、到达日历、配置与各项统计；
+    不包括可以由车辆重建的索引 (环道索引、排队队列、SoA 数组)，也不包括
+    写盘线程、轨迹录制、性能统计包装和界面对象。
+    """
+    heatmap = sim.heatmap
+    return {
+        'version': SNAPSHOT_VERSION,
+        'config': dict(sim.config),
+        'seed': sim.seed,
+        'batched_idm': sim.state_arrays is not None,
+        'weights': (sim.weight_aggressive, sim.weight_conservative),
+        'rng': sim.rng.getstate(),
+        'arrival_rng': sim.arrival_rng.getstate(),
+        'clock': (sim.tick, sim.sim_time, sim.skipped_ticks),
+        'counters': (sim.spawn_seq, sim.total_conflicts, sim.stat_timer, sim.speed_sum, sim.speed_count),
+        'vehicles': sim.vehicles,
+        'paths': sim.paths.keys,  # 车辆的 path_id 指向按需生成的路径表，恢复时按同样顺序重新生成
+        'arrivals': {name: getattr(sim.arrivals, name) for name in ARRIVAL_FIELDS},
+        'stats': sim.stats.to_dict(),
+        'heatmap': (heatmap.counts, heatmap.recent_grid, heatmap._t0, heatmap.total),
+        'telemetry': dict({name: getattr(sim.telemetry, name) for name in TELEMETRY_FIELDS},
+                          flow=list(sim.telemetry.flow), conflicts=list(sim.telemetry.conflicts)),
+        'trips': list(sim.trips),
+        'travel_times': list(sim.stats_travel_times),
+    }
+
+
+def dumps(sim, level=6):
+    """压缩后的二进制快照 (pickle 协议 5 + zlib)。"""
+    return zlib.compress(pickle.dumps(capture(sim), protocol=5), level)
+
+
+def loads(data):
+    state = pickle.loads(zlib.decompress(data))
+    if state.get('version') not in READABLE_VERSIONS:
+        raise ValueError(f"不支持的快照版本: {state.get('version')}")
+    return state
+
+
+def save_snapshot(sim, path=None):
+    """把快照写入 path (默认 report/snapshot_<时间戳>_<仿真毫秒>.snap)，返回文件名。"""
+    if path is None:
+        if not os.path.exists('report'):
+            os.makedirs('report')
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join('report', f"snapshot_{timestamp}_{int(sim.sim_time * 1000)}.snap")
+    with open(path, 'wb') as f:
+        f.write(dumps(sim))
+    return path
+
+
+def load_snapshot(path):
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+def restore(state, cls=None, keep_stats=True, **kwargs):
+    """由快照 (loads 的结果或二进制数据) 重建仿真；cls 默认为 RoundaboutEngine，
+    kwargs 传给构造函数 (如 AdvancedSim 的 telemetry_dir)。
+
+    keep_stats=False 时只恢复交通状态 (车辆、时钟、随机数、到达日历)，
+    统计从零开始，适合丢弃预热期后再开始测量。
+    """
+    if isinstance(state, (bytes, bytearray)):
+        state = loads(state)
+    if cls is None:
+        from engine import RoundaboutEngine
+        cls = RoundaboutEngine
+    # 同一份快照可能被多次恢复，车辆等可变对象都从原字典深拷贝
+    state = pickle.loads(pickle.dumps(state, protocol=5))
+
+    sim = cls(state['config'], batched_idm=state['batched_idm'], seed=state['seed'], **kwargs)
+    sim.weight_aggressive, sim.weight_conservative = state['weights']
+    sim.rng.setstate(state['rng'])
+    sim.arrival_rng.setstate(state['arrival_rng'])
+    sim.tick, sim.sim_time, sim.skipped_ticks = state['clock']
+    sim.spawn_seq, sim.total_conflicts, sim.stat_timer, sim.speed_sum, sim.speed_count = state['counters']
+    for name, value in state['arrivals'].items():
+        setattr(sim.arrivals, name, value)
+
+    # 车辆与由车辆重建的索引：两种索引都按 (位置, 生成序号) 严格有序，重建后与原索引一致
+    sim.paths.build(state['paths'])
+    sim.vehicles = state['vehicles']
+    for v in sorted((v for v in sim.vehicles if v.state == APPROACHING), key=lambda v: (v.dist_to_center, v.seq)):
+        sim.approach_queues[v.start_angle].push(v)
+    for v in sim.vehicles:
+        if ENTERING <= v.state <= EXITING:
+            sim.ring_index.update(v)
+        if sim.state_arrays is not None:
+            sim.state_arrays.add(v)
+
+    if keep_stats:
+        _restore_stats(sim, state)
+    else:
+        sim.total_conflicts = 0
+        sim.arrivals.scheduled = [0] * len(sim.directions)
+        sim.arrivals.dropped = [0] * len(sim.directions)
+        sim.arrivals.retries = 0
+    return sim
+
+
+def _restore_stats(sim, state):
+    from online_stats import StreamingStats
+    stats = StreamingStats.from_dict(state['stats'])
+    sim.stats.groups = stats.groups
+    heatmap = sim.heatmap
+    heatmap.counts, heatmap.recent_grid, heatmap._t0, heatmap.total = state['heatmap']
+
+    telemetry = state['telemetry']
+    sim.telemetry.flow.extend(telemetry['flow'])
+    sim.telemetry.conflicts.extend(telemetry['conflicts'])
+    for name in TELEMETRY_FIELDS:
+        setattr(sim.telemetry, name, telemetry[name])
+    for row in state['trips']:
+        sim.trips.add(row)
+    sim.stats_travel_times.extend(state['travel_times'])
+
+
+def fork(state, overrides=None, seed=None, weights=None, cls=None, keep_stats=False, **kwargs):
+    """从快照分叉出一个新实验：恢复后改写参数，可选地用新种子重置两条随机数流。
+
+    overrides 为要修改的 config 项 (FROZEN_KEYS 中的项必须与快照相同)；
+    seed 为 None 时沿用快照中的随机数状态，各分支面对同一串后续到达 (公共随机数)。
+    """
+    if isinstance(state, (bytes, bytearray)):
+        state = loads(state)
+    overrides = dict(overrides or {})
+    for key in FROZEN_KEYS:
+        if key in overrides and overrides[key] != state['config'][key]:
+            raise ValueError(f"{key} 在构造时确定，不能在快照分叉时修改 (快照中为 {state['config'][key]!r})")
+
+    sim = restore(state, cls, keep_stats, **kwargs)
+    sim.config.update(overrides)
+    if 'spawn_rate' in overrides:
+        # 已经排进日历的下一次到达保持不变，之后的到达按新到达率抽取
+        sim.arrivals.set_rates(overrides['spawn_rate'])
+    if weights is not None:
+        sim.weight_aggressive, sim.weight_conservative = weights
+    if seed is not None:
+        sim.seed = seed
+        sim.rng.seed(seed)
+        sim.arrival_rng.seed(sim.rng.getrandbits(64))
+    return sim
@@ -0,0 +1,237 @@
+import os
+import csv
+import json
+import argparse
+import itertools
+import math
+from datetime import datetime
+from functools import partial
+from multiprocessing import Pool
+from engine import RoundaboutEngine, DEFAULT_CONFIG, RECORD_KEYS, check_ring_lanes
+from online_stats import StreamingStats
+from snapshot import load_snapshot, fork
+
+# 参数网格中可以扫描的维度 (权重是仿真对象属性，其余写入 config)
+WEIGHT_KEYS = ['weight_aggressive', 'weight_conservative']
+CONFIG_KEYS = ['car_max_v', 'safe_gap', 'yield_angle', 'spawn_rate', 'ring_lanes']
+PARAM_KEYS = WEIGHT_KEYS + CONFIG_KEYS + ['seed']
+
+DEFAULT_GRID = {
+    'weight_aggressive': [5],
+    'weight_conservative': [5],
+    'car_max_v': [DEFAULT_CONFIG['car_max_v']],
+    'safe_gap': [DEFAULT_CONFIG['safe_gap']],
+    'yield_angle': [DEFAULT_CONFIG['yield_angle']],
+    'spawn_rate': [DEFAULT_CONFIG['spawn_rate']],
+    'ring_lanes': [DEFAULT_CONFIG['ring_lanes']],
+    'seed': [0],
+}
+
+
+def expand_grid(grid):
+    """把 {参数: [取值, ...]} 展开成每个格点一份参数字典，未给出的维度取默认值。"""
+    full = dict(DEFAULT_GRID)
+    full.update({k: list(v) for k, v in grid.items()})
+    return [dict(zip(PARAM_KEYS, values)) for values in itertools.product(*(full[k] for k in PARAM_KEYS))]
+
+
+def simulate_cell(cell, duration, snapshot=None):
+    """在当前进程中无界面运行一个格点，返回运行结束的引擎 (由调用方 close)。
+
+    给定快照文件时从快照分叉 (跳过预热期)：车辆与到达日历沿用快照，统计从零开始，
+    参数改为本格点的取值，随机数流用本格点的种子重置。
+    """
+    config = {k: cell[k] for k in CONFIG_KEYS}
+    weights = (cell['weight_aggressive'], cell['weight_conservative'])
+    if snapshot is not None:
+        sim = fork(load_snapshot(snapshot), config, seed=cell['seed'], weights=weights)
+    else:
+        sim = RoundaboutEngine(config, seed=cell['seed'])
+        sim.weight_aggressive, sim.weight_conservative = weights
+    try:
+        sim.run_steps(int(round(duration / sim.dt)))
+    except BaseException:
+        sim.close()
+        raise
+    return sim
+
+
+def run_cell(cell, duration, snapshot=None):
+    """运行一个格点，返回带参数列的车辆档案。"""
+    sim = simulate_cell(cell, duration, snapshot)
+    try:
+        return [dict(cell, **record) for record in sim.collect_records()]
+    finally:
+        sim.close()
+
+
+def run_sweep(grid, duration=600.0, processes=None, filename=None, snapshot=None):
+    """用进程池把所有格点跑完，结果合并写入一张表 (参数列 + traffic_analysis 的列)。"""
+    cells = expand_grid(grid)
+    if filename is None:
+        if not os.path.exists('report'):
+            os.makedirs('report')
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = os.path.join('report', f'sweep_results_{timestamp}.csv')
+
+    total = 0
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=PARAM_KEYS + RECORD_KEYS)
+        writer.writeheader()
+        with Pool(processes) as pool:
+            for i, rows in enumerate(pool.imap(partial(run_cell, duration=duration, snapshot=snapshot), cells), 1):
+                writer.writerows(rows)
+                total += len(rows)
+                print(f"[{i}/{len(cells)}] {cells[i - 1]} -> {len(rows)} 条记录")
+
+    print(f"参数扫描完成！共 {len(cells)} 个格点、{total} 条记录。文件名: {filename}")
+    return filename
+
+
+# 双侧 95% 置信区间的 t 分位数 (自由度 1~30)，更大的自由度用正态近似
+T_CRIT_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+             2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+             2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+REPLICATION_METRICS = ['travel_time', 'wait_time', 'conflicts']
+
+
+def confidence_interval(values):
+    """返回 (均值, 95% 置信区间半宽)；样本少于 2 个时半宽为 inf。"""
+    n = len(values)
+    mean = sum(values) / n
+    if n < 2:
+        return mean, math.inf
+    var = sum((x - mean) ** 2 for x in values) / (n - 1)
+    t = T_CRIT_95[n - 2] if n - 1 <= len(T_CRIT_95) else 1.96
+    return mean, t * math.sqrt(var / n)
+
+
+def run_replica(cell, duration, snapshot=None):
+    """运行一次独立重复实验，返回 ({车型: {指标: 已完成车辆的均值}}, 在线统计的 to_dict())。
+
+    均值直接取自引擎的在线统计，不再逐条扫描车辆档案；统计本身也一并返回，
+    供主进程合并成所有重复实验的总体分布。
+    """
+    sim = simulate_cell(cell, duration, snapshot)
+    sim.close()
+    stats = sim.stats
+    summary = {}
+    for key, group in stats.groups.items():
+        if key.startswith('type:') and group.counts['completed']:
+            summary[key[len('type:'):]] = {m: group.metrics[m].mean for m in REPLICATION_METRICS}
+    return summary, stats.to_dict()
+
+
+def run_replications(params=None, replications=10, duration=600.0, processes=None,
+                     precision=None, max_replications=100, filename=None, snapshot=None):
+    """用 R 个不同种子并行重复同一组参数，汇总各车型指标的均值与 95% 置信区间。
+
+    给定 precision (相对半宽，如 0.05) 时按批次继续追加种子，直到所有区间
+    半宽 <= precision * |均值| 或达到 max_replications 为止。
+    """
+    base = expand_grid({k: [v] for k, v in (params or {}).items() if k != 'seed'})[0]
+    first_seed = (params or {}).get('seed', 0)
+    results = []
+    pooled = StreamingStats()
+
+    with Pool(processes) as pool:
+        batch = replications
+        while batch > 0:
+            seeds = range(first_seed + len(results), first_seed + len(results) + batch)
+            for summary, stats in pool.map(partial(run_replica, duration=duration, snapshot=snapshot),
+                                           [dict(base, seed=seed) for seed in seeds]):
+                results.append(summary)
+                pooled.merge(StreamingStats.from_dict(stats))
+
+            rows = _summarize_replications(results)
+            print(f"已完成 {len(results)} 次重复实验")
+            if precision is None:
+                break
+            # 没有任何车辆完成行程时也没有可用的区间，同样视为未达到精度
+            wide = [r for r in rows if not r['half_width'] <= precision * abs(r['mean'])]
+            if rows and not wide:
+                break
+            if len(results) >= max_replications:
+                print(f"已达到 {max_replications} 次重复实验上限，仍未达到目标精度 {precision}")
+                break
+            batch = min(replications, max_replications - len(results))
+
+    for r in rows:
+        print(f"{r['type']:>12} {r['metric']:>11}: {r['mean']:.3f} ± {r['half_width']:.3f} (n={r['n']})")
+    for key in sorted(pooled.groups):
+        n, mean, std, p50, p90 = pooled.summary(key, 'travel_time')
+        if n:
+            print(f"{key:>18} 通行时间 (合并 {n} 辆): {mean:.2f} ± {std:.2f} s, p50 {p50:.1f}, p90 {p90:.1f}")
+
+    if filename is None:
+        if not os.path.exists('report'):
+            os.makedirs('report')
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = os.path.join('report', f'replications_{timestamp}.csv')
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=PARAM_KEYS[:-1] + ['type', 'metric', 'n', 'mean',
+                                                                 'half_width', 'ci_low', 'ci_high'])
+        writer.writeheader()
+        for r in rows:
+            writer.writerow(dict({k: base[k] for k in PARAM_KEYS[:-1]}, **r))
+    # 合并后的在线统计 (均值/方差/分位数草图) 写在汇总表旁边
+    stats_file = os.path.splitext(filename)[0] + '_stats.json'
+    with open(stats_file, 'w', encoding='utf-8') as f:
+        json.dump(dict(pooled.to_dict(), replications=len(results)), f, ensure_ascii=False, indent=2)
+    print(f"重复实验汇总已保存至: {filename} (合并统计: {stats_file})")
+    return rows
+
+
+def _summarize_replications(results):
+    rows = []
+    for v_type in sorted({t for summary in results for t in summary}):
+        for metric in REPLICATION_METRICS:
+            values = [summary[v_type][metric] for summary in results if v_type in summary]
+            mean, half = confidence_interval(values)
+            rows.append({'type': v_type, 'metric': metric, 'n': len(values), 'mean': mean,
+                         'half_width': half, 'ci_low': mean - half, 'ci_high': mean + half})
+    return rows
+
+
+def _ring_lanes_arg(text):
+    # 在主进程解析参数时就拒绝无效车道数，而不是在进程池的工作进程里才失败
+    try:
+        return check_ring_lanes(int(text))
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(str(exc))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="环岛仿真批量参数扫描 (无界面、多进程)")
+    parser.add_argument('--weight-aggressive', type=float, nargs='+', default=DEFAULT_GRID['weight_aggressive'])
+    parser.add_argument('--weight-conservative', type=float, nargs='+', default=DEFAULT_GRID['weight_conservative'])
+    parser.add_argument('--car-max-v', type=float, nargs='+', default=DEFAULT_GRID['car_max_v'])
+    parser.add_argument('--safe-gap', type=float, nargs='+', default=DEFAULT_GRID['safe_gap'])
+    parser.add_argument('--yield-angle', type=float, nargs='+', default=DEFAULT_GRID['yield_angle'])
+    parser.add_argument('--spawn-rate', type=float, nargs='+', default=DEFAULT_GRID['spawn_rate'])
+    parser.add_argument('--ring-lanes', type=_ring_lanes_arg, nargs='+', default=DEFAULT_GRID['ring_lanes'])
+    parser.add_argument('--seeds', type=int, nargs='+', default=DEFAULT_GRID['seed'])
+    parser.add_argument('--duration', type=float, default=600.0, help="每个格点的仿真时长 (仿真秒)")
+    parser.add_argument('--processes', type=int, default=None, help="进程数，默认使用全部 CPU 核心")
+    parser.add_argument('--output', default=None, help="结果文件路径，默认 report/sweep_results_<时间戳>.csv")
+    parser.add_argument('--replications', type=int, default=None,
+                        help="重复实验模式：用每个参数的第一个取值、从第一个种子开始跑 R 个种子")
+    parser.add_argument('--precision', type=float, default=None,
+                        help="重复实验模式下的目标相对精度 (如 0.05)，达到后停止追加种子")
+    parser.add_argument('--max-replications', type=int, default=100)
+    parser.add_argument('--snapshot', default=None,
+                        help="从快照 (界面 F5 保存的 .snap) 分叉每个格点，跳过预热期；--ring-lanes 须与快照一致")
+    args = parser.parse_args()
+
+    grid = {key: getattr(args, key) for key in WEIGHT_KEYS + CONFIG_KEYS}
+    grid['seed'] = args.seeds
+    if args.replications:
+        params = {key: values[0] for key, values in grid.items()}
+        run_replications(params, args.replications, args.duration, args.processes,
+                         args.precision, args.max_replications, args.output, args.snapshot)
+    else:
+        run_sweep(grid, args.duration, args.processes, args.output, args.snapshot)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import os
+import csv
+import queue
+import threading
+from collections import deque
+
+FLOW_HEADER = ['Time_Seconds', 'Number_of_Vehicles', 'Avg_Speed_Efficiency', 'Conflicts']
+CONFLICT_HEADER = ['Time_Seconds', 'X', 'Y']
+
+
+class ChunkWriter(threading.Thread):
+    """后台写盘线程：按块接收数据行追加到 CSV，每块写完立即 flush + fsync。"""
+
+    def __init__(self, path, header):
+        super().__init__(daemon=True)
+        self.path = path
+        self.header = header
+        self._queue = queue.Queue()
+        self.start()
+
+    def run(self):
+        with open(self.path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.header)
+            while True:
+                chunk = self._queue.get()
+                if chunk is None:
+                    break
+                writer.writerows(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def write(self, rows):
+        self._queue.put(rows)
+
+    def close(self):
+        self._queue.put(None)
+        self.join()
+
+
+class Telemetry:
+    """流量与冲突时间序列的有界采集。
+
+    流量按 bucket_seconds 仿真秒聚合成一行 (平均环岛车数、平均速度、本桶冲突数)，
+    内存中只保留最近 keep_buckets 个桶和 keep_conflicts 个冲突点；
+    给定 directory 时，完整序列每满 flush_rows 行交给后台线程追加写盘，
+    所以内存占用与运行时长无关，崩溃时最多丢失最后一块。
+    """
+
+    def __init__(self, directory=None, tag='', bucket_seconds=1.0, keep_buckets=3600,
+                 keep_conflicts=10000, flush_rows=10):
+        self.bucket_seconds = bucket_seconds
+        self.flush_rows = flush_rows
+        self.flow = deque(maxlen=keep_buckets)  # (平均车数, 平均速度)
+        self.conflicts = deque(maxlen=keep_conflicts)  # (x, y)
+
+        self._bucket = None  # 当前桶编号
+        self._ticks = 0
+        self._count_sum = 0.0
+        self._speed_sum = 0.0
+        self._bucket_conflicts = 0
+        self._flow_rows = []
+        self._conflict_rows = []
+
+        self._flow_writer = self._conflict_writer = None
+        if directory is not None:
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            self._flow_writer = ChunkWriter(os.path.join(directory, f'flow_series_{tag}.csv'), FLOW_HEADER)
+            self._conflict_writer = ChunkWriter(os.path.join(directory, f'conflict_points_{tag}.csv'),
+                                                CONFLICT_HEADER)
+
+    def _roll(self, sim_time):
+        bucket = int(sim_time // self.bucket_seconds)
+        if bucket == self._bucket:
+            return
+        if self._bucket is not None and (self._ticks or self._bucket_conflicts):
+            self._close_bucket()
+        self._bucket = bucket
+
+    def _close_bucket(self):
+        if self._ticks:
+            mean_count, mean_speed = self._count_sum / self._ticks, self._speed_sum / self._ticks
+            self.flow.append((mean_count, mean_speed))
+        else:
+            mean_count = mean_speed = 0.0
+        self._flow_rows.append((round(self._bucket * self.bucket_seconds, 3), round(mean_count, 3),
+                                round(mean_speed, 3), self._bucket_conflicts))
+        self._ticks = 0
+        self._count_sum = self._speed_sum = 0.0
+        self._bucket_conflicts = 0
+        if len(self._flow_rows) >= self.flush_rows:
+            self.flush()
+
+    def add_flow(self, sim_time, flow_count, avg_speed):
+        """记录一个物理步的环岛车数与平均速度 (只在环岛内有车时调用)。"""
+        self._roll(sim_time)
+        self._ticks += 1
+        self._count_sum += flow_count
+        self._speed_sum += avg_speed
+
+    def add_conflict(self, sim_time, x, y):
+        self._roll(sim_time)
+        self._bucket_conflicts += 1
+        self.conflicts.append((x, y))
+        self._conflict_rows.append((round(sim_time, 3), round(x, 1), round(y, 1)))
+        if len(self._conflict_rows) >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        """把已完成的数据块交给后台线程写盘；未启用写盘时直接丢弃 (内存中仍有最近数据)。"""
+        if self._flow_writer is not None and self._flow_rows:
+            self._flow_writer.write(self._flow_rows)
+        if self._conflict_writer is not None and self._conflict_rows:
+            self._conflict_writer.write(self._conflict_rows)
+        self._flow_rows = []
+        self._conflict_rows = []
+
+    def close(self):
+        """结束当前桶、写出剩余数据并等待后台线程退出。"""
+        if self._bucket is not None and (self._ticks or self._bucket_conflicts):
+            self._close_bucket()
+        self.flush()
+        for writer in (self._flow_writer, self._conflict_writer):
+            if writer is not None:
+                writer.close()
+        self._flow_writer = self._conflict_writer = None
@@ -0,0 +1,24 @@
+from heatmap import ConflictHeatmap
+
+
+def test_long_gap_between_conflicts_does_not_overflow():
+    # 两次冲突之间相隔远超 log2(RENORMALIZE_AT) 个半衰期：放大系数本身会溢出，必须先比较指数
+    heatmap = ConflictHeatmap(800, 10, 60.0)
+    heatmap.add(100, 100, 29000.0)
+    heatmap.add(100, 100, 64000.0)
+    heatmap.add(100, 100, 1e7)
+
+    assert heatmap.total == 3
+    assert heatmap.counts[10, 10] == 3
+    recent = heatmap.recent(1e7)
+    # 早先的冲突已衰减到可以忽略，只剩刚加入的一次
+    assert abs(recent[10, 10] - 1.0) < 1e-12
+    assert recent.sum() == recent[10, 10]
+
+
+def test_recent_grid_halves_every_half_life():
+    heatmap = ConflictHeatmap(800, 10, 60.0)
+    heatmap.add(100, 100, 0.0)
+    heatmap.add(100, 100, 60.0)
+    assert abs(heatmap.recent(60.0)[10, 10] - 1.5) < 1e-12
+    assert abs(heatmap.recent(120.0)[10, 10] - 0.75) < 1e-12
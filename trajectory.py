@@ -0,0 +1,135 @@
+import os
+import json
+import math
+import numpy as np
+from columnar import CATEGORIES
+from vehicle import STATE_CODES
+
+# 每辆车每个物理步一条定长记录 (14 字节)，坐标/朝向/速度量化成整数存储
+RECORD_DTYPE = np.dtype([
+    ('id', '<u4'),
+    ('state', 'u1'),
+    ('type', 'u1'),
+    ('x', '<i2'),  # 像素 * XY_SCALE
+    ('y', '<i2'),
+    ('heading', '<i2'),  # 弧度 * HEADING_SCALE，范围 (-pi, pi]
+    ('v', '<u2'),  # 像素/秒 * SPEED_SCALE
+])
+XY_SCALE = 16  # 1/16 像素精度，可表示 -2048 ~ 2047 像素 (驶离车辆最远约 1400)
+HEADING_SCALE = 10000
+SPEED_SCALE = 100
+TYPE_CODES = {label: code for code, label in enumerate(CATEGORIES['type'])}
+TYPE_LABELS = CATEGORIES['type']
+
+
+class TrajectoryRecorder:
+    """把每个物理步的全部车辆状态追加写入定长记录的二进制日志。
+
+    base_path + '.traj' 为记录流，'.idx' 为每帧第一条记录的序号 (int64)，
+    '.json' 为量化参数等元数据。记录先在内存里攒 flush_frames 帧再整块写盘，
+    两个数据文件都只追加，录制中途也能被 TrajectoryLog 打开。
+    """
+
+    def __init__(self, base_path, dt, flush_frames=250, ring_lanes=1, lane_radii=None):
+        self.base_path = base_path
+        self.flush_frames = flush_frames
+        directory = os.path.dirname(base_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        meta = {
+            'dt': dt,
+            'xy_scale': XY_SCALE,
+            'heading_scale': HEADING_SCALE,
+            'speed_scale': SPEED_SCALE,
+            'types': TYPE_LABELS,
+            'states': STATE_CODES,
+            'ring_lanes': ring_lanes,  # 回放时按同样的车道数绘制路网
+            'lane_radii': list(lane_radii or []),
+        }
+        with open(base_path + '.json', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        self._records = open(base_path + '.traj', 'wb')
+        self._index = open(base_path + '.idx', 'wb')
+        self.frames = 0
+        self.count = 0  # 已记录的车辆记录总数
+        self._chunks = []
+        self._offsets = []
+
+    def record(self, engine):
+        """记录引擎当前时刻的所有车辆 (在 step 之后调用，每次调用为一帧)。"""
+        vehicles = engine.vehicles
+        frame = np.empty(len(vehicles), RECORD_DTYPE)
+        for i, v in enumerate(vehicles):
+            x, y = engine.get_coords(v)
+            heading = math.remainder(v.angle_to_draw, 2 * math.pi)
+            frame[i] = (v.id, v.state, TYPE_CODES[v.type],
+                        round(x * XY_SCALE), round(y * XY_SCALE),
+                        round(heading * HEADING_SCALE), round(max(0.0, v.v) * SPEED_SCALE))
+        self._offsets.append(self.count)
+        self._chunks.append(frame)
+        self.count += len(frame)
+        self.frames += 1
+        if len(self._offsets) >= self.flush_frames:
+            self.flush()
+
+    def flush(self):
+        if not self._offsets:
+            return
+        self._records.write(np.concatenate(self._chunks).tobytes())
+        self._index.write(np.asarray(self._offsets, dtype='<i8').tobytes())
+        self._records.flush()
+        self._index.flush()
+        self._chunks = []
+        self._offsets = []
+
+    def close(self):
+        self.flush()
+        self._records.close()
+        self._index.close()
+
+
+class TrajectoryLog:
+    """以内存映射方式打开录制好的轨迹日志，按帧随机访问，打开耗时与录制时长无关。"""
+
+    def __init__(self, base_path):
+        if base_path.endswith(('.traj', '.idx', '.json')):
+            base_path = os.path.splitext(base_path)[0]
+        self.base_path = base_path
+        with open(base_path + '.json', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.dt = self.meta['dt']
+        self.types = self.meta['types']
+        self.ring_lanes = self.meta.get('ring_lanes', 1)  # 早先的录制没有该字段，均为单车道
+        self.records = self._map(base_path + '.traj', RECORD_DTYPE)
+        self.offsets = self._map(base_path + '.idx', np.dtype('<i8'))
+
+    @staticmethod
+    def _map(path, dtype):
+        # 空文件无法建立映射；只取完整记录部分 (录制中的文件末尾可能有半条)
+        n = os.path.getsize(path) // dtype.itemsize
+        if n == 0:
+            return np.zeros(0, dtype)
+        return np.memmap(path, dtype=dtype, mode='r', shape=(n,))
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @property
+    def duration(self):
+        return len(self) * self.dt
+
+    def frame(self, i):
+        """第 i 帧的原始记录 (结构化数组视图，不拷贝)。"""
+        start = self.offsets[i]
+        end = self.offsets[i + 1] if i + 1 < len(self.offsets) else len(self.records)
+        return self.records[start:end]
+
+    def poses(self, i):
+        """第 i 帧解码后的 [(x, y, heading, 车型), ...]，可直接交给 draw_vehicles。"""
+        rec = self.frame(i)
+        xs = rec['x'] / self.meta['xy_scale']
+        ys = rec['y'] / self.meta['xy_scale']
+        headings = rec['heading'] / self.meta['heading_scale']
+        return [(x, y, h, self.types[t]) for x, y, h, t in zip(xs.tolist(), ys.tolist(),
+                                                                headings.tolist(), rec['type'].tolist())]
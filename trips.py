@@ -0,0 +1,89 @@
+import os
+import csv
+import tempfile
+
+TRIP_KEYS = ['id', 'type', 'travel_time', 'wait_time', 'conflicts', 'status']
+_CASTS = {'id': int, 'travel_time': float, 'wait_time': float, 'conflicts': int}
+
+
+class TripSink:
+    """车辆档案 (每辆车一行) 的收集器。
+
+    行先缓存在内存里，达到 memory_rows 行时整批溢写到临时 CSV 文件，
+    因此内存占用有上限；遍历时先读回溢写部分再给出内存中的部分。
+    close() 之后溢写文件已删除，收集器不能再记录或读取 (需要的档案应在关闭前取出)。
+    """
+
+    def __init__(self, memory_rows=50000, spill_dir=None):
+        self.memory_rows = memory_rows
+        self.spill_dir = spill_dir
+        self.rows = []
+        self.spilled = 0
+        self._spill_path = None
+        self.closed = False
+
+    def __len__(self):
+        return self.spilled + len(self.rows)
+
+    def _check_open(self):
+        if self.closed:
+            raise ValueError("TripSink 已关闭，溢写的档案已删除")
+
+    def add(self, row):
+        self._check_open()
+        self.rows.append(row)
+        if len(self.rows) >= self.memory_rows:
+            self._spill()
+
+    def _spill(self):
+        if self._spill_path is None:
+            fd, self._spill_path = tempfile.mkstemp(prefix='trips_', suffix='.csv', dir=self.spill_dir)
+            os.close(fd)
+        with open(self._spill_path, 'a', newline='', encoding='utf-8') as f:
+            csv.DictWriter(f, fieldnames=TRIP_KEYS).writerows(self.rows)
+        self.spilled += len(self.rows)
+        self.rows = []
+
+    def __iter__(self):
+        self._check_open()
+        return self._iter_rows()
+
+    def _iter_rows(self):
+        if self._spill_path is not None:
+            with open(self._spill_path, newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f, fieldnames=TRIP_KEYS):
+                    for key, cast in _CASTS.items():
+                        row[key] = cast(row[key])
+                    yield row
+        yield from self.rows
+
+    def finalize(self, filename, extra_rows=()):
+        """把全部档案 (溢写 + 内存 + extra_rows) 写入 filename，返回写出的行数。
+
+        收集器本身不清空，之后还可以继续记录并再次导出。
+        """
+        self._check_open()
+        count = 0
+        with open(filename, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=TRIP_KEYS)
+            writer.writeheader()
+            if self._spill_path is not None:
+                with open(self._spill_path, newline='', encoding='utf-8') as spill:
+                    for line in spill:
+                        f.write(line)
+                        count += 1
+            writer.writerows(self.rows)
+            count += len(self.rows)
+            for row in extra_rows:
+                writer.writerow(row)
+                count += 1
+        return count
+
+    def close(self):
+        """删除溢写用的临时文件并丢弃内存中的档案，之后不能再记录或读取。"""
+        if self._spill_path is not None and os.path.exists(self._spill_path):
+            os.remove(self._spill_path)
+        self._spill_path = None
+        self.spilled = 0
+        self.rows = []
+        self.closed = True
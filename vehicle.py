@@ -1,10 +1,32 @@
 import numpy as np
 import math
-import pygame
+
+# 车辆状态用整数编码 (比较与数组同步都不再涉及字符串)；ENTERING ~ EXITING 属于环岛内
+APPROACHING, ENTERING, CIRCULATING, EXITING, STRAIGHT_OUT = range(5)
+STATE_NAMES = ("APPROACHING", "ENTERING", "CIRCULATING", "EXITING", "STRAIGHT_OUT")
+STATE_CODES = {name: code for code, name in enumerate(STATE_NAMES)}
 
 
 class Vehicle:
-    def __init__(self, id, behavior_type="conservative"):
+    """车辆记录：属性全部在 __slots__ 中声明，没有 __dict__，每辆车的内存占用固定。
+
+    仿真写入的状态机字段 (state、start_angle、path_index 等) 也在这里声明并由 reset
+    统一初始化，所以 VehiclePool 回收的对象不会残留上一辆车的状态。
+    """
+
+    __slots__ = (
+        'id', 'type', 'v0', 'T', 'a_max', 'b', 's0',
+        'v', 'a', 'pos', 'lane', 'ring_radius', 'radius_offset',
+        'wait_time', 'enter_time', 'finish_time', 'conflict_count', 'spawn_time',
+        'state', 'start_angle', 'end_angle', 'dist_to_center', 'current_angle',
+        'path_id', 'path_index', 'visual_x', 'visual_y', 'angle_to_draw',
+        'yielding', 'seq', 'slot',
+    )
+
+    def __init__(self, id, behavior_type="conservative", spawn_time=0.0):
+        self.reset(id, behavior_type, spawn_time)
+
+    def reset(self, id, behavior_type="conservative", spawn_time=0.0):
         self.id = id
         self.type = behavior_type
 
@@ -23,8 +45,11 @@ class Vehicle:
             self.s0 = 30.0
 
         self.v = self.v0 * 0.5  # 当前速度
+        self.a = 0.0
         self.pos = 0.0  # 沿路径的累计位置
-        self.lane = 0  # 车道索引
+        self.lane = 0  # 环道索引 (0 为最外侧车道)
+        self.ring_radius = 0.0  # 所在环道的行车半径，进入环岛或换道时由仿真设置
+        self.radius_offset = 0.0  # 换道时绘制半径相对 ring_radius 的剩余偏移
 
         self.wait_time = 0  # 统计在入口等待的总时长
         self.enter_time = 0  # 进入环岛的时间
@@ -34,25 +59,50 @@ class Vehicle:
         self.visual_x = None
         self.visual_y = None
 
-        self.spawn_time = pygame.time.get_ticks()
+        self.spawn_time = spawn_time  # 生成时刻（仿真秒）
+
+        # 状态机字段，由仿真在生成与状态转移时写入
+        self.state = APPROACHING
+        self.start_angle = 0.0
+        self.end_angle = 0.0
+        self.dist_to_center = 0.0
+        self.current_angle = 0.0
+        self.path_id = -1  # 共享路径表中的入口/出口路径编号
+        self.path_index = 0  # 沿路径的进度 (路径点序号，可为小数)
+        self.angle_to_draw = 0.0
+        self.yielding = False  # 是否正在停止线前礼让环岛车
+        self.seq = id  # 生成序号
+        self.slot = -1  # 批量 IDM 数组中的槽位
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        # 也接受改用 __slots__ 之前的快照：属性在 __dict__ 中，状态为字符串，可能缺少部分字段
+        self.reset(state['id'], state['type'], state.get('spawn_time', 0.0))
+        for name, value in state.items():
+            if name in self.__slots__:
+                setattr(self, name, value)
+        if isinstance(self.state, str):
+            self.state = STATE_CODES[self.state]
 
     def update_acceleration(self, lead_vehicle):
-        max_accel = getattr(self, 'a_max', 1.5)
-        s0 = getattr(self, 's0', 10)
-        T = getattr(self, 'T', 1.5)
-        b = getattr(self, 'b', 1.5)
+        max_accel = self.a_max
+        s0 = self.s0
+        T = self.T
+        b = self.b
 
         s = 1000.0
         delta_v = 0.0
 
         if lead_vehicle:
-            if self.state in ["ENTERING", "CIRCULATING", "EXITING"]:
+            if ENTERING <= self.state <= EXITING:
                 # 环岛内距离计算：弧长
                 angle_diff = (self.current_angle - lead_vehicle.current_angle) % (2 * math.pi)
                 # 如果算出来 angle_diff 太接近 2pi，说明前车就在屁股后面，间距应该是极小的正数
                 if angle_diff > math.pi: angle_diff = 0.1
-                s = angle_diff * 145.0  # 使用外圈半径计算更准确
-            elif self.state == "APPROACHING":
+                s = angle_diff * self.ring_radius  # 按本车所在环道的半径换算弧长
+            elif self.state == APPROACHING:
                 s = self.dist_to_center - lead_vehicle.dist_to_center
 
             delta_v = self.v - lead_vehicle.v
@@ -76,7 +126,7 @@ class Vehicle:
 
         # --- 【关键疏通逻辑】 ---
         # 如果车辆在环岛系统内（非直线排队态），且速度极低
-        if self.state in ["ENTERING", "CIRCULATING", "EXITING"]:
+        if ENTERING <= self.state <= EXITING:
             if self.v < 1.0:
                 # 只要前面有 15 像素（约半个车身）的空隙，强制给加速度起步
                 if s > 15.0:
@@ -89,3 +139,30 @@ class Vehicle:
             total_accel = 0
 
         return max(-b * 3, min(max_accel, total_accel))
+
+
+class VehiclePool:
+    """已离场车辆对象的回收列表：生成新车时优先复用，避免大流量运行中的频繁分配。
+
+    最多保留 limit 个空闲对象；取出时由 Vehicle.reset 重新初始化全部字段。
+    """
+
+    def __init__(self, limit=1024):
+        self.limit = limit
+        self.free = []
+        self.created = 0  # 新分配的对象数
+        self.reused = 0  # 复用的次数
+
+    def acquire(self, id, behavior_type="conservative", spawn_time=0.0):
+        if self.free:
+            v = self.free.pop()
+            v.reset(id, behavior_type, spawn_time)
+            self.reused += 1
+            return v
+        self.created += 1
+        return Vehicle(id, behavior_type, spawn_time)
+
+    def release(self, v):
+        """车辆离场且所有事件处理完之后调用；之后不能再持有该对象。"""
+        if len(self.free) < self.limit:
+            self.free.append(v)
@@ -0,0 +1,203 @@
+import numpy as np
+from vehicle import ENTERING, CIRCULATING, EXITING
+
+RING_STATE_MAX = EXITING  # 编码 ENTERING ~ EXITING 属于环岛内
+
+CAR_LENGTH_GAP = 45.0  # 车身长度补偿
+NO_LEADER_GAP = 1000.0  # 没有前车时的等效间距
+
+
+def idm_accelerations(v, v0, T, a_max, b, s0, in_ring, has_lead, s, delta_v):
+    """批量计算 IDM 加速度，规则与 Vehicle.update_acceleration 逐条对应。
+
+    所有参数都是形状相同的数组 (一维或带副本维度的二维均可)；
+    s 为未扣除车身长度的原始间距，has_lead 为 False 的位置忽略 s 与 delta_v。
+    """
+    s = np.where(has_lead, s - CAR_LENGTH_GAP, NO_LEADER_GAP)
+    delta_v = np.where(has_lead, delta_v, 0.0)
+    s = np.maximum(s, 2.0)  # 严禁距离变成 0
+
+    # IDM 核心公式：自由行驶项 + 跟驰交互项
+    accel_free = a_max * (1 - (np.maximum(0, v) / v0) ** 4)
+    s_star = s0 + np.maximum(0, v * T + (v * delta_v) / (2 * np.sqrt(a_max * b)))
+    accel_int = -a_max * (s_star / s) ** 2
+    total = accel_free + accel_int
+
+    # 环岛内低速疏通：前方空隙 > 15 像素就强制起步，否则停住
+    unjam = in_ring & (v < 1.0)
+    total = np.where(unjam, np.where(s > 15.0, 1.0, 0.0), total)
+
+    # 严禁倒车
+    total = np.where((v <= 0) & (total < 0), 0.0, total)
+    total = np.clip(total, -b * 3, a_max)
+
+    # 极其危险距离：比前车快就紧急刹车，否则保持静止 (不经过上面的限幅)
+    emergency = np.where(delta_v > 0, -b * 4.0, 0.0)
+    return np.where(s < 10.0, emergency, total)
+
+
+def lead_accelerations(v, dist, angle, state, radius, v0, T, a_max, b, s0, lead_slots):
+    """按前车槽位批量计算 IDM 加速度；数组最后一维为槽位，前面可以有副本维度。"""
+    lead_slots = np.asarray(lead_slots, dtype=np.intp)
+    has_lead = lead_slots >= 0
+    lead = np.where(has_lead, lead_slots, 0)
+    in_ring = (state >= ENTERING) & (state <= RING_STATE_MAX)
+
+    # 环岛内用弧长，引道上用到中心距离之差
+    angle_diff = (angle - np.take_along_axis(angle, lead, -1)) % (2 * np.pi)
+    angle_diff = np.where(angle_diff > np.pi, 0.1, angle_diff)
+    s = np.where(in_ring, angle_diff * radius, dist - np.take_along_axis(dist, lead, -1))
+    delta_v = v - np.take_along_axis(v, lead, -1)
+    return idm_accelerations(v, v0, T, a_max, b, s0, in_ring, has_lead, s, delta_v)
+
+
+def ring_kinematics(v, angle, state, radius, accels, dt):
+    """CIRCULATING 分支的环道运动学：限速 [3, 12] 后的速度与沿环道前进后的角度。
+
+    与 update() 中逐车的计算逐位相同；mask 只标出本步开始时在环道上且速度 >= 0.2 的车
+    (更慢的车还要经过强行起步补丁，仍由逐车代码处理)。
+    """
+    mask = (state == CIRCULATING) & (v >= 0.2)
+    new_v = np.minimum(np.maximum(np.maximum(v + accels * dt, 0.0), 3.0), 12.0)
+    step = np.divide(new_v, radius, out=np.zeros_like(new_v), where=mask) * dt
+    return mask, new_v, (angle - step) % (2 * np.pi)
+
+
+class VehicleArrays:
+    """结构化数组 (SoA) 形式的车辆状态库。
+
+    每辆车在加入时分配一个槽位 (v.slot)，IDM 参数只在加入时写入一次；
+    位置、速度、角度、状态等动态字段在每个物理步开始时批量同步。
+    删除采用与末尾交换的方式，保持数组紧凑。
+    """
+
+    FIELDS = {
+        'v': np.float64, 'dist': np.float64, 'angle': np.float64, 'state': np.int8, 'radius': np.float64,
+        'v0': np.float64, 'T': np.float64, 'a_max': np.float64, 'b': np.float64, 's0': np.float64,
+    }
+
+    def __init__(self, capacity=64):
+        self.size = 0
+        self.owners = []  # 槽位 -> Vehicle
+        self._alloc(capacity)
+
+    def _alloc(self, capacity):
+        old = hasattr(self, 'v')
+        for name, dtype in self.FIELDS.items():
+            arr = np.zeros(capacity, dtype=dtype)
+            if old:
+                arr[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, arr)
+        # 避免空槽位在 v0/a_max/b 上出现除零
+        for name in ('v0', 'a_max', 'b'):
+            getattr(self, name)[self.size:] = 1.0
+        self.capacity = capacity
+
+    def add(self, v):
+        if self.size == self.capacity:
+            self._alloc(self.capacity * 2)
+        i = self.size
+        v.slot = i
+        self.owners.append(v)
+        self.v0[i], self.T[i], self.a_max[i] = v.v0, v.T, v.a_max
+        self.b[i], self.s0[i] = v.b, v.s0
+        self.size += 1
+
+    def remove(self, v):
+        i, last = v.slot, self.size - 1
+        if i != last:
+            moved = self.owners[last]
+            self.owners[i] = moved
+            moved.slot = i
+            for name in self.FIELDS:
+                arr = getattr(self, name)
+                arr[i] = arr[last]
+        self.owners.pop()
+        for name in ('v0', 'a_max', 'b'):
+            getattr(self, name)[last] = 1.0
+        self.size -= 1
+        v.slot = -1
+
+    def sync(self):
+        """从车辆对象批量读取本步开始时的动态状态。"""
+        n = self.size
+        owners = self.owners
+        self.v[:n] = np.fromiter((o.v for o in owners), np.float64, n)
+        self.dist[:n] = np.fromiter((o.dist_to_center for o in owners), np.float64, n)
+        self.angle[:n] = np.fromiter((o.current_angle for o in owners), np.float64, n)
+        self.state[:n] = np.fromiter((o.state for o in owners), np.int8, n)
+        self.radius[:n] = np.fromiter((o.ring_radius for o in owners), np.float64, n)
+
+    def accelerations(self, lead_slots):
+        """lead_slots[i] 为槽位 i 的前车槽位 (-1 表示无前车)，返回全部车辆的加速度。"""
+        n = self.size
+        return lead_accelerations(self.v[:n], self.dist[:n], self.angle[:n], self.state[:n], self.radius[:n],
+                                  self.v0[:n], self.T[:n], self.a_max[:n], self.b[:n], self.s0[:n], lead_slots)
+
+    def ring_kinematics(self, accels, dt):
+        """(mask, 速度, 角度)，按槽位排列，见模块函数 ring_kinematics。"""
+        n = self.size
+        return ring_kinematics(self.v[:n], self.angle[:n], self.state[:n], self.radius[:n], accels, dt)
+
+
+class EnsembleArrays:
+    """K 个仿真副本共用的状态数组：每个字段形状为 (K, 容量)，第 k 行属于第 k 个副本。
+
+    每个副本通过 rows[k] (ReplicaArrays，接口与 VehicleArrays 相同) 增删车辆和同步状态，
+    加速度与环道运动学则对全部副本一次性批量计算；各行中超出该副本车辆数的槽位是填充，
+    结果被忽略。容量不够时所有行一起扩容。
+    """
+
+    FIELDS = VehicleArrays.FIELDS
+
+    def __init__(self, replicas, capacity=64):
+        self.rows = [ReplicaArrays(self, k) for k in range(replicas)]
+        self.capacity = 0
+        self._alloc(capacity)
+
+    def _alloc(self, capacity):
+        for name, dtype in self.FIELDS.items():
+            arr = np.zeros((len(self.rows), capacity), dtype=dtype)
+            if self.capacity:
+                arr[:, :self.capacity] = getattr(self, name)
+            setattr(self, name, arr)
+            for k, row in enumerate(self.rows):
+                setattr(row, name, arr[k])
+        for row in self.rows:
+            for name in ('v0', 'a_max', 'b'):
+                getattr(row, name)[row.size:] = 1.0
+            row.capacity = capacity
+        self.capacity = capacity
+
+    @property
+    def width(self):
+        """所有副本中最多的车辆数 (批量计算的列数)。"""
+        return max(row.size for row in self.rows)
+
+    def sync(self):
+        for row in self.rows:
+            row.sync()
+
+    def accelerations(self, lead_slots):
+        """lead_slots 形状为 (K, width)，返回 (K, width) 的加速度。"""
+        n = lead_slots.shape[1]
+        return lead_accelerations(self.v[:, :n], self.dist[:, :n], self.angle[:, :n], self.state[:, :n],
+                                  self.radius[:, :n], self.v0[:, :n], self.T[:, :n], self.a_max[:, :n],
+                                  self.b[:, :n], self.s0[:, :n], lead_slots)
+
+    def ring_kinematics(self, accels, dt):
+        n = accels.shape[1]
+        return ring_kinematics(self.v[:, :n], self.angle[:, :n], self.state[:, :n], self.radius[:, :n], accels, dt)
+
+
+class ReplicaArrays(VehicleArrays):
+    """EnsembleArrays 中的一行：字段是父数组第 k 行的视图，扩容交给父对象统一进行。"""
+
+    def __init__(self, parent, row):
+        self.parent = parent
+        self.row = row
+        self.size = 0
+        self.owners = []
+
+    def _alloc(self, capacity):
+        self.parent._alloc(capacity)